@@ -0,0 +1,361 @@
+import sys
+import os
+import csv
+import json
+import math
+import random
+import argparse
+import platform
+import sqlite3
+import subprocess
+import tempfile
+import shutil
+from datetime import datetime
+from itertools import accumulate
+from pathlib import Path
+from time import perf_counter
+
+
+# GLOBALS
+
+BENCHMARKS_DIR = Path(__file__).parent.resolve()
+ROOT_DIR = BENCHMARKS_DIR.parent
+MAIN_DIR = ROOT_DIR / "main"
+RESULTS_DIR = BENCHMARKS_DIR / "results"
+
+sys.path.insert(0, str(MAIN_DIR))
+import ParseNewTestament as pnt
+
+# (chapters, verses) of each book of the New Testament, in book_abbrevs order
+NT_SHAPE = {
+    "MAT": (28, 1071), "MAR": (16, 678), "LUK": (24, 1151), "JOH": (21, 879), "ACT": (28, 1007),
+    "ROM": (16, 433), "1CO": (16, 437), "2CO": (13, 257), "GAL": (6, 149), "EPH": (6, 155),
+    "PHP": (4, 104), "COL": (4, 95), "1TH": (5, 89), "2TH": (3, 47), "1TI": (6, 113),
+    "2TI": (4, 83), "TIT": (3, 46), "PHM": (1, 25), "HEB": (13, 303), "JAM": (5, 108),
+    "1PE": (5, 105), "2PE": (3, 61), "1JO": (5, 105), "2JO": (1, 13), "3JO": (1, 15),
+    "JUD": (1, 25), "REV": (22, 404)
+}
+
+# About 138,000 words in 7,957 verses
+WORDS_PER_VERSE = 17
+
+# Distinct forms and Strong's numbers of the synthetic vocabulary - about those of the New Testament, whatever the scale,
+# since a bigger corpus of the same language repeats its words rather than inventing new ones
+FORM_COUNT = 20000
+STR_NUM_COUNT = 5624
+
+# The CCAT and Strong's files write chapters and verses with two digits, so a book can't have more than 99 of either -
+# past that a scale makes the verses longer instead
+MAX_CHAPTERS = 99
+MAX_VERSES = 99
+
+DEFAULT_SCALES = (1, 10, 50)
+
+# Robinson-Pierpont codes the synthetic words are parsed with
+RP_CODES = ["{N-NSF}", "{N-GSF}", "{N-GSM}", "{N-NSM}", "{N-ASM}", "{N-DSF}", "{N-NPM}", "{T-ASM}", "{T-DSM}", "{T-NSM}",
+            "{T-GSF}", "{CONJ}", "{PREP}", "{ADV}", "{PRT-N}", "{HEB}", "{INJ}", "{COND}", "{P-1NS}", "{P-3GSM}",
+            "{D-NSM}", "{I-NSM}", "{S-1NSF}", "{A-NPM}", "{A-APN}", "{A-NUI}", "{A-NSM-C}", "{V-AAI-3S}", "{V-IAI-3S}",
+            "{V-PAP-NSM}", "{V-2AAI-3S}", "{V-PAN}", "{V-FAI-2S}", "{V-2ADI-3P}", "{V-2RAI-3S-ATT}", "{V-PAI-3S}"]
+
+# (code, alt_code) pairs a word can have two parsings with
+RP_ALT_CODES = [("{N-NSF}", "{N-VSF}"), ("{N-NSM}", "{N-VSM}"), ("{A-APN}", "{A-NPN}"), ("{V-PAI-3S}", "{V-PEI-3S}")]
+
+PROPER_NOUN_CODE = "{N-PRI}"
+
+CONSONANTS = ["B", "G", "D", "Z", "Q", "K", "L", "M", "N", "C", "P", "R", "S", "T", "F", "X", "Y"]
+VOWELS = ["A", "E", "H", "I", "O", "U", "W"]
+ACCENTS = ["/", "=", "\\"]
+BREATHINGS = [")", "("]
+PUNCTUATION = ["", "", "", "", "", ",", ".", ":", ";"]
+
+# Footnote marks the SBLGNT puts before words
+SBL_MARKS = ["⸀", "⸂", "⸃"]
+
+
+# SYNTHETIC SOURCES
+
+# The files of the SBLGNT text, in book_abbrevs order
+def sbl_book_names():
+    return [path.stem for path in pnt.sbl_book_paths()]
+
+# Converts betacode to unicode with the same tables as make_word_instances uses for source_unicode
+def make_transliterator():
+    diacritic_map = {betacode: diacritic for diacritic, betacode, _ in pnt.betacode_diacritics()}
+    return pnt.BetacodeTransliterator(pnt.betacode_alphabet_map(), diacritic_map, pnt.betacode_punctuation_map(), True)
+
+# Returns FORM_COUNT (betacode, strongs_word, str_num, code, alt_code) forms, most frequent first
+# No two forms have the same letters, so every std_poly_form has a single Strong's number
+def make_vocabulary(rng):
+    vocabulary = []
+    seen = set()
+    while len(vocabulary) < FORM_COUNT:
+        syllables = [rng.choice(CONSONANTS) + rng.choice(VOWELS) for _ in range(rng.randint(1, 4))]
+        if rng.random() < 0.3:
+            syllables.insert(0, rng.choice(VOWELS))
+        if rng.random() < 0.5:
+            syllables.append(rng.choice(["S", "N", ""]))
+        letters = "".join(syllables)
+        if letters in seen:
+            continue
+        seen.add(letters)
+
+        # The accent goes on one of the last vowels, and a breathing on a vowel at the start of the word
+        symbols = list(letters)
+        vowel_indexes = [i for i, letter in enumerate(symbols) if letter in VOWELS]
+        symbols[vowel_indexes[-1 if len(vowel_indexes) == 1 else rng.choice((-1, -2))]] += rng.choice(ACCENTS)
+        if symbols[0][0] in VOWELS:
+            symbols[0] = symbols[0][0] + rng.choice(BREATHINGS) + symbols[0][1:]
+        betacode = "".join(symbols)
+
+        str_num = rng.randint(1, STR_NUM_COUNT)
+        alt_code = None
+        if symbols[0][0] in CONSONANTS and rng.random() < 0.03:
+            betacode = "*" + betacode
+            code = PROPER_NOUN_CODE
+        elif rng.random() < 0.05:
+            code, alt_code = rng.choice(RP_ALT_CODES)
+        else:
+            code = rng.choice(RP_CODES)
+        vocabulary.append((betacode, letters.lower(), str_num, code, alt_code))
+    return vocabulary
+
+# Lines of a Strong's definitions csv with the columns make_strongs_info reads
+def strongs_definition_rows(rng):
+    rows = [["Strong's"] + [f"column_{i}" for i in range(1, 17)]]
+    for str_num in range(1, STR_NUM_COUNT + 1):
+        row = [""] * 17
+        row[0] = f"G{str_num}"
+        row[1] = str_num
+        if rng.random() < 0.01:
+            row[2] = "not used"
+        else:
+            row[2] = f"λῆμμα{str_num}"
+            row[3] = f"Definition of {str_num}. KJV: gloss{str_num}, +thing See also: G{rng.randint(1, STR_NUM_COUNT)}"
+            row[11] = f"root{rng.randint(1, STR_NUM_COUNT)}"
+            if rng.random() < 0.3:
+                row[13] = f"root{rng.randint(1, STR_NUM_COUNT)}"
+            if rng.random() < 0.1:
+                row[15] = f"root{rng.randint(1, STR_NUM_COUNT)}"
+        rows.append(row)
+    return rows
+
+# (chapters, verses per chapter, words per verse) of a book at a scale
+def book_shape(book, scale):
+    chapters, verses = NT_SHAPE[book]
+    target_verses = verses * scale
+    chapters = min(MAX_CHAPTERS, chapters * scale)
+    verses_per_chapter = min(MAX_VERSES, math.ceil(target_verses / chapters))
+    words_per_verse = max(1, round(WORDS_PER_VERSE * target_verses / (chapters * verses_per_chapter)))
+    return chapters, verses_per_chapter, words_per_verse
+
+# Writes CCAT .TXT, Strong's .bp5, unicode csv and SBLGNT text files, and the Strong's definitions, for scale times
+# the New Testament into sources_dir, laid out like external_sources
+# The words follow a Zipf distribution over the vocabulary, and the SBLGNT text drops, adds and swaps words and
+# verses of the Byzantine text the way the real editions differ
+# Returns the number of Byzantine words
+def generate_sources(sources_dir, scale, seed = 1):
+    rng = random.Random(seed)
+    sources_dir = Path(sources_dir)
+    ccat_dir = sources_dir / "byzantine-majority-text-master" / "source" / "ccat"
+    strongs_dir = sources_dir / "byzantine-majority-text-master" / "source" / "Strongs"
+    unicode_dir = sources_dir / "byzantine-majority-text-master" / "csv-unicode" / "ccat" / "no-variants"
+    sbl_dir = sources_dir / "SBLGNT-master" / "data" / "sblgnt" / "text"
+    for directory in (ccat_dir, strongs_dir, unicode_dir, sbl_dir):
+        directory.mkdir(parents=True, exist_ok=True)
+
+    transliterator = make_transliterator()
+    # The vocabulary and definitions are made first, so they are the same at every scale
+    vocabulary = make_vocabulary(rng)
+    with open(sources_dir / pnt.strongs_definitions_path().name, "w", encoding="utf-8", newline="") as file:
+        csv.writer(file).writerows(strongs_definition_rows(rng))
+    cum_weights = list(accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+
+    word_count = 0
+    for book_number, (book, sbl_name) in enumerate(zip(pnt.book_abbrevs, sbl_book_names()), 1):
+        chapters, verses_per_chapter, words_per_verse = book_shape(book, scale)
+        ccat_lines = []
+        strongs_lines = []
+        unicode_rows = [("chapter", "verse", "text")]
+        sbl_lines = [sbl_name.upper()]
+        for chapter in range(1, chapters + 1):
+            for verse in range(1, verses_per_chapter + 1):
+                forms = rng.choices(vocabulary, cum_weights=cum_weights,
+                                    k=rng.randint(max(1, words_per_verse // 2), words_per_verse * 3 // 2))
+                word_count += len(forms)
+                betacode_words = [form[0] + rng.choice(PUNCTUATION) for form in forms]
+                unicode_words = [transliterator.convert(word) for word in betacode_words]
+                strongs_words = []
+                for _, strongs_word, str_num, code, alt_code in forms:
+                    strongs_words.append(f"{strongs_word} {str_num} {code}" + (f" {str_num} {alt_code}" if alt_code else ""))
+
+                # Verses are split over two lines, and some start paragraphs or have variants
+                half = len(forms) // 2
+                ccat_line = f"{chapter:02d}:{verse:02d} " + ("? " if rng.random() < 0.1 else "") + " ".join(betacode_words[:half])
+                if rng.random() < 0.05:
+                    ccat_line += " {VAR1: " + betacode_words[-1] + "}"
+                ccat_lines.append(ccat_line)
+                ccat_lines.append("    " + " ".join(betacode_words[half:]))
+                strongs_lines.append(f" {chapter:02d}.{verse:02d} " + " ".join(strongs_words[:half]))
+                strongs_lines.append("    " + " ".join(strongs_words[half:]))
+                unicode_rows.append((chapter, verse, ("¶ " if rng.random() < 0.1 else "") + " ".join(unicode_words)))
+
+                change = rng.random()
+                if change < 0.03:
+                    continue
+                sbl_words = list(unicode_words)
+                if change < 0.2 and len(sbl_words) > 2:
+                    del sbl_words[rng.randrange(len(sbl_words))]
+                elif change < 0.35:
+                    i = rng.randrange(len(sbl_words))
+                    j = rng.randrange(len(sbl_words))
+                    sbl_words[i], sbl_words[j] = sbl_words[j], sbl_words[i]
+                elif change < 0.45:
+                    sbl_words.insert(rng.randrange(len(sbl_words) + 1), transliterator.convert(rng.choice(vocabulary)[0]))
+                if rng.random() < 0.15:
+                    sbl_words[0] = rng.choice(SBL_MARKS) + sbl_words[0]
+                sbl_lines.append(f"{sbl_name} {chapter}:{verse}\t" + " ".join(sbl_words))
+
+        (ccat_dir / f"{book_number:02d}_{book}.TXT").write_text("\n".join(ccat_lines) + "\n", encoding="utf-8")
+        (strongs_dir / f"{book_number:02d}_{book}.bp5").write_text("\n".join(strongs_lines) + "\n", encoding="utf-8")
+        with open(unicode_dir / f"{book}.csv", "w", encoding="utf-8", newline="") as file:
+            csv.writer(file).writerows(unicode_rows)
+        (sbl_dir / f"{sbl_name}.txt").write_text("\n".join(sbl_lines) + "\n", encoding="utf-8")
+
+    return word_count
+
+
+# STAGE RUNS
+
+# Points the build at a benchmark directory holding external_sources, tools, output and WordGuide.db - the long_traits
+# stage writes into tools, so it gets a copy of main/tools instead of the one in the repository
+def use_work_dir(work_dir):
+    pnt.TOOLS_DIR = work_dir / "tools"
+    pnt.SOURCES_DIR = work_dir / "external_sources"
+    pnt.OUTPUT_DIR = work_dir / "output"
+    pnt.DB_PATH = work_dir / "WordGuide.db"
+    pnt.OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+# Runs one stage against the tables the earlier stages left in work_dir, the way main runs it, and returns its
+# wall time and the rows it made - called in a child process, so the stage starts with nothing in memory
+def run_stage(work_dir, stage_name, jobs):
+    use_work_dir(work_dir)
+    stage = next(stage for stage in pnt.STAGES if stage.name == stage_name)
+    conn = sqlite3.connect(pnt.DB_PATH)
+    cursor = conn.cursor()
+    resources = {"cursor": cursor, "conn": conn, "corpus": pnt.Corpus(cursor), "normalizers": pnt.NormalizerPool(),
+                 "jobs": jobs, "books": None}
+
+    with pnt.build_pragmas(conn):
+        start = perf_counter()
+        conn.execute("BEGIN")
+        stage.function(*[resources[name] for name in stage.arguments])
+        conn.commit()
+        seconds = perf_counter() - start
+
+    rows = pnt.stage_rows(cursor, stage)
+    conn.close()
+    return {"stage": stage_name, "seconds": seconds, "rows": rows}
+
+# Peak resident memory of a finished child process in MB - ru_maxrss is in KiB on Linux and in bytes on macOS
+def peak_rss_mb(rusage):
+    if sys.platform == "darwin":
+        return rusage.ru_maxrss / (1024 * 1024)
+    return rusage.ru_maxrss / 1024
+
+# Runs a stage in a child process and adds the child's peak memory to what it reports
+def benchmark_stage(work_dir, stage_name, jobs):
+    process = subprocess.Popen([sys.executable, __file__, "--run-stage", stage_name, "--work-dir", str(work_dir), "--jobs", str(jobs)],
+                               stdout=subprocess.PIPE, text=True)
+    output = process.stdout.read()
+    process.stdout.close()
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"ERROR IN benchmark_stage: STAGE {stage_name} EXITED WITH {process.returncode}")
+
+    result = json.loads(output.strip().splitlines()[-1])
+    result["rows_per_second"] = result["rows"] / result["seconds"] if result["rows"] and result["seconds"] else None
+    result["peak_rss_mb"] = peak_rss_mb(rusage)
+    return result
+
+def benchmark_scale(work_dir, scale, stage_names, jobs, seed):
+    if work_dir.exists():
+        shutil.rmtree(work_dir)
+    work_dir.mkdir(parents=True)
+
+    start = perf_counter()
+    word_count = generate_sources(work_dir / "external_sources", scale, seed)
+    shutil.copytree(MAIN_DIR / "tools", work_dir / "tools")
+    print(f"{scale}x: generated {word_count} words in {perf_counter() - start:.1f} s", flush=True)
+
+    results = []
+    for stage_name in stage_names:
+        result = benchmark_stage(work_dir, stage_name, jobs)
+        result = {"scale": scale, "words": word_count, **result}
+        results.append(result)
+        rate = f"{result['rows_per_second']:.0f} rows/s" if result["rows_per_second"] else "-"
+        print(f"{scale}x {stage_name}: {result['seconds']:.2f} s, {result['rows']} rows, {rate}, {result['peak_rss_mb']:.0f} MB peak", flush=True)
+    return results
+
+
+def parse_args(argv = None):
+    stage_names = [stage.name for stage in pnt.STAGES]
+    parser = argparse.ArgumentParser(description="Benchmarks every stage of ParseNewTestament.py on synthetic sources "
+                                     "at several multiples of the size of the New Testament.")
+    parser.add_argument("--scales", default=",".join(str(scale) for scale in DEFAULT_SCALES), metavar="N,N,...",
+                        help="comma separated multiples of the New Testament to benchmark (default: %(default)s)")
+    parser.add_argument("--jobs", type=int, default=1, metavar="N", help="worker processes for the stages that use them (default: 1)")
+    parser.add_argument("--parquet", action="store_true", help="also benchmark the parquet export (needs pyarrow)")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the synthetic sources (default: 1)")
+    parser.add_argument("--work-dir", type=Path, metavar="DIR",
+                        help="where to write the sources and databases, kept afterwards (default: a temporary directory)")
+    parser.add_argument("--output", type=Path, metavar="PATH",
+                        help="results file (default: benchmarks/results/benchmark_<time>.json)")
+    parser.add_argument("--run-stage", choices=stage_names, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv = None):
+    args = parse_args(argv)
+
+    if args.run_stage:
+        print(json.dumps(run_stage(args.work_dir, args.run_stage, args.jobs)))
+        return
+
+    scales = [int(scale) for scale in args.scales.split(",")]
+    if any(scale < 1 for scale in scales):
+        raise ValueError(f"ERROR IN main: SCALES MUST BE WHOLE NUMBERS OF AT LEAST 1, GOT {args.scales}")
+    stage_names = [stage.name for stage in pnt.STAGES if stage.name not in pnt.OPTIONAL_STAGES or args.parquet]
+
+    work_root = args.work_dir
+    if work_root is None:
+        work_root = Path(tempfile.mkdtemp(prefix="word_guide_benchmark_"))
+    work_root = work_root.resolve()
+
+    results = []
+    try:
+        for scale in scales:
+            results += benchmark_scale(work_root / f"scale_{scale}", scale, stage_names, args.jobs, args.seed)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    output = args.output
+    if output is None:
+        output = RESULTS_DIR / f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "jobs": args.jobs,
+        "seed": args.seed,
+        "results": results
+    }
+    output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,230 +1,67 @@
 import sqlite3
 import unicodedata
 import re
-from collections import defaultdict
-import pandas as pd
+import argparse
+import hashlib
+import csv
+import json
+import cProfile
+import tracemalloc
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from difflib import SequenceMatcher
+from functools import lru_cache, partial
+from itertools import chain, groupby
+from operator import itemgetter
+from datetime import datetime
+from time import perf_counter
 from pathlib import Path
-import os
+import sys
 
 
 # GLOBALS
 
+MAIN_DIR = Path(__file__).parent.resolve()
+ROOT_DIR = MAIN_DIR.parent
+TOOLS_DIR = MAIN_DIR / "tools"
+SOURCES_DIR = ROOT_DIR / "external_sources"
+OUTPUT_DIR = ROOT_DIR / "output"
+DB_PATH = ROOT_DIR / "WordGuide.db"
+
 book_abbrevs = ["MAT", "MAR", "LUK", "JOH", "ACT", "ROM", "1CO", "2CO", "GAL", "EPH", 
          "PHP", "COL", "1TH", "2TH", "1TI", "2TI", "TIT", "PHM", "HEB", "JAM", 
          "1PE", "2PE", "1JO", "2JO", "3JO", "JUD", "REV"]
 
+# Number of rows BulkWriter buffers per INSERT statement before sending them with executemany
+BULK_BATCH_SIZE = 10000
 
-# HELPER FUNCTIONS
-
-# removes ? which denotes the start of paragraphs
-# removes variants (in between {})
-# and ensures words at the end and beginning of lines aren't stuck together
-def clean_betacode(text):    
-    lines = text.splitlines()
-    joined = " ".join(line.strip() for line in lines if line.strip())
-    cleaned = joined.replace("?", "")
-    cleaned = re.sub(r"\{[^}]*\}", "", cleaned)
-    cleaned = re.sub(r"\s+", " ", cleaned).strip()
-    return cleaned
-
-# removes ¶ which denotes the start of paragraphs
-# and ensures words at the end and beginning of lines aren't stuck together
-def clean_unicode(text):  
-    lines = text.splitlines()
-    joined = " ".join(line.strip() for line in lines if line.strip())
-    cleaned = joined.replace("¶", "")
-    cleaned = re.sub(r"\s+", " ", cleaned).strip()
-    return cleaned
-
-def simplify_betacode(word, remove_capitals = False, diacritic_list = None, punctuation_list = None):
-    if remove_capitals:
-        word = word.replace("*", "")
-    if diacritic_list is not None:
-        for key in diacritic_list:
-            word = word.replace(key, "")
-    if punctuation_list is not None:
-        for key in punctuation_list:
-            word = word.replace(key, "")
-    return word
-
-def simplify_unicode(word, diacritic_list = None, punctuation_list = None):
-    word = unicodedata.normalize('NFD', word)
-    if diacritic_list is not None:
-        for key in diacritic_list:
-            word = word.replace(key, "")
-    if punctuation_list is not None:
-        for key in punctuation_list:
-            word = word.replace(key, "")
-    word = unicodedata.normalize('NFC', word)
-    return word
-
-def betacode_to_unicode(old_word, alphabet_map, diacritic_map = None, punctuation_map = None, has_capitals = False):
-    letters = [""] * len(old_word)
-    
-    old_word_list = list(old_word)
-
-    if has_capitals:
-        star_index = old_word.find('*')
-        if star_index != -1:
-            capitalize(old_word_list, star_index, alphabet_map)
-
-    i = 0
-    while i < len(old_word_list):
-        char = None
-        char = alphabet_map.get(old_word_list[i])
-        if char is not None:
-            if is_last_letter(old_word_list, i, alphabet_map) and char == "σ":
-                char = "ς"
-        else:
-            if diacritic_map is not None:
-                char = diacritic_map.get(old_word_list[i])
-            if punctuation_map is not None and char is None:
-                char = punctuation_map.get(old_word_list[i])                    
-                    
-            if char is None:
-                char = "!" # Test to see if any errors
-        letters[i] = char
-        i += 1
-    word = ''.join(letters)
-    word = re.sub(r"\s+", "", word)
-    word = unicodedata.normalize('NFC', word)
-    return word
-    
+# Number of distinct words each GreekNormalizer method remembers - more than the distinct forms in the New Testament
+NORMALIZER_CACHE_SIZE = 65536
 
-def is_consonant(char):
-    vowels = "aeiouAEIOU"
-    return char.isalpha() and char not in vowels
+# The oldest SQLite the build runs on - the verse tables are built with window functions, which came in 3.25, and
+# verse_search is tokenized with remove_diacritics 2, which came in 3.27
+MIN_SQLITE_VERSION = (3, 27, 0)
 
-def is_last_letter(word, index, alphabet_map):
-    length = len(word)
-    if index >= length:
-        return True
-    for i in range(index + 1, length):
-        if word[i] in alphabet_map:
-            return False
-    return True
+# PRAGMAs used while the tables are being built - the previous values are restored afterwards
+# The rollback journal stays on disk so a stage interrupted by a crash is rolled back and the build can continue from it -
+# each stage is one transaction, so NORMAL only syncs a few times per stage
+BUILD_PRAGMAS = {
+    "journal_mode": "DELETE",
+    "synchronous": "NORMAL",
+    "cache_size": -256000, # in KiB, so about 256 MB
+    "temp_store": "MEMORY"
+}
 
-def capitalize(word, index, alphabet_map):
-    if index >= len(word) - 1:
-        raise ValueError("ERROR IN capitalize: * APPEARS AT END OF WORD OR INCORRECT INDEX")
-    else:
-        for i in range(index + 1, len(word)):
-            if word[i] in alphabet_map:
-                word[index] += word[i]
-                del(word[i])
-                return
-    raise ValueError("ERROR IN capitalize: NO * IN WORD")
 
-def is_after_consonant(word, index, alphabet_map):
-    for i in range(index - 1, -1, -1):
-        if word[i] in alphabet_map:
-            if is_consonant(word[i]):
-                return True
-            return False
-    raise ValueError("ERROR IN is_after_consonant: NO LETTERS BEFORE INDEX")
+# SOURCE FILES
 
-def decode_rp_code(code, info_df, long_trait_df, trait_table_dfs):
-    rp_dict = defaultdict(lambda: "")
-    rp_pos = "!"
-    code = code.replace("{", "")
-    code = code.replace("}", "")
-    code_parts = code.split("-")
-    info  = "".join(code_parts[1:])
-    possible_traits = []
-    trait_code_list = []
-
-    # All possible trait sequences for this part of speech
-    matching_info_df = info_df[info_df['abbreviation'] == code_parts[0]]
-
-    index_row = matching_info_df.iterrows()
-
-    for _, info_row in index_row:
-        long_trait_codes_set = set()
-        # Get all values from the info_row as a set of strings
-        info_values = set(map(str, info_row.values))
-
-        # Find trait rows where origin_table matches any value in info_row
-        matching_traits = long_trait_df[long_trait_df['origin_table'].astype(str).isin(info_values)]
-
-        long_trait_codes_set.update(matching_traits['code'])
-
-        # making an element of trait_code_list, a list of lists of abbreviations for traits
-        trait_codes = []
-        j = 0
-        while j < len(info):
-            matched = False
-            for sub in long_trait_codes_set:
-                if info.startswith(sub, j):
-                    trait_codes.append(sub)
-                    j += len(sub)
-                    matched = True
-                    break
-            if not matched:
-                trait_codes.append(info[j])
-                j += 1
-        num_traits = int(info_row["num traits"])
-        if len(trait_codes) != num_traits:
-            continue
-        # Append to trait_code_list after above statement to prevent adding an invalid set of codes
-        trait_code_list.append(trait_codes)
-        rp_pos = info_row['pos']
-        traits = []
-        for j in range(1, num_traits + 1):
-            traits.append(info_row["trait " + str(j)])
-        possible_traits.append(traits)
-        
-    for j in range(0, len(possible_traits)):
-        valid = True
-        if len(trait_code_list[j]) != len(possible_traits[j]):
-            raise ValueError(f"ERROR in decode_rp_code: different lengths - trait_code_list[j]: {trait_code_list[j]} possible_traits[j]: {possible_traits[j]}")
-        for k in range(0, len(possible_traits[j])):
-            possible_trait_df = trait_table_dfs[possible_traits[j][k]]
-            matching_trait_df = possible_trait_df[possible_trait_df['Abbreviation'] == trait_code_list[j][k]]
-
-            if not matching_trait_df.empty:
-                rp_dict[possible_traits[j][k]] = matching_trait_df.iloc[0][possible_traits[j][k]]
-            else:
-                rp_dict[possible_traits[j][k]] = "Unknown"
-                valid = False
-            
-        if valid:
-            for k, v in rp_dict.items():
-                if str(v).lower() == "unknown":
-                    rp_dict[k] = ""
-            break
-
-    return { "pos": rp_pos, "dict": rp_dict }
-                            
-
-# converts to standard polytonic form - no capitals unless word is a proper noun, keep accents but grave accents turned into accute
-def to_std_poly_form(word, is_proper_noun = False, diacritic_map = None):
-    if is_proper_noun:
-        word = word[0] + word[1:].lower()
-    else:
-        word = word.lower()
-    # Decompose characters into base + combining marks
-    decomposed = unicodedata.normalize("NFD", word)
-    replaced = decomposed.replace(diacritic_map["Grave accent"], diacritic_map["Acute accent"])
-    # Recompose characters
-    return unicodedata.normalize("NFC", replaced)
-
-# DATABASE FUNCTIONS
-
-def make_betacode_bible(cursor): 
-    cursor.execute('DROP TABLE IF EXISTS betacode_bible')
-
-    cursor.execute('''CREATE TABLE IF NOT EXISTS betacode_bible (
-                   id INTEGER PRIMARY KEY AUTOINCREMENT,
-                   word VARCHAR(45),
-                   book VARCHAR(45),
-                   chapter INTEGER,
-                   verse INTEGER,
-                   word_index INTEGER,
-                   total_word_index INTEGER
-                   )''')
-    
-    base = (Path(__file__).parent / ".." / "external_sources" / "byzantine-majority-text-master" / "source" / "ccat").resolve()
-    book_file_paths = [
+# CCAT betacode text of each book
+def betacode_book_paths():
+    base = SOURCES_DIR / "byzantine-majority-text-master" / "source" / "ccat"
+    return [
         base / "01_MAT.TXT",   # Matthew
         base / "02_MAR.TXT",   # Mark
         base / "03_LUK.TXT",   # Luke
@@ -254,86 +91,879 @@ def make_betacode_bible(cursor):
         base / "27_REV.TXT"    # Revelation
     ]
 
-    total_word_index = 1
-    book_counter = 0
-    for file_path in book_file_paths:
-        with open(file_path, "r", encoding="utf-8") as file:
-            contents = file.read()
-            cleaned = clean_betacode(contents)
-            words = cleaned.split(" ")
-            book = book_abbrevs[book_counter]
-            chapter = 1
-            verse = 1
-            word_index = 1
-            for word in words:
-                # chapter and verse is now in form Chapter:Verse
-                if len(word) == 5 and (word.replace(":", "")).isdigit() and word[2] == ":":
-                    last_chapter = chapter
-                    last_verse = verse
-                    chapter = int(word[:2])
-                    verse = int(word[3:])
-                    if chapter != last_chapter or verse != last_verse:
-                        word_index = 1
+# Unicode text of each book from byzantine-majority-text
+def external_unicode_book_paths():
+    base = SOURCES_DIR / "byzantine-majority-text-master" / "csv-unicode" / "ccat" / "no-variants"
+    return [
+        base / "MAT.csv",   # Matthew
+        base / "MAR.csv",   # Mark
+        base / "LUK.csv",   # Luke
+        base / "JOH.csv",   # John
+        base / "ACT.csv",   # Acts
+        base / "ROM.csv",   # Romans
+        base / "1CO.csv",   # 1 Corinthians
+        base / "2CO.csv",   # 2 Corinthians
+        base / "GAL.csv",   # Galatians
+        base / "EPH.csv",   # Ephesians
+        base / "PHP.csv",   # Philippians
+        base / "COL.csv",   # Colossians
+        base / "1TH.csv",   # 1 Thessalonians
+        base / "2TH.csv",   # 2 Thessalonians
+        base / "1TI.csv",   # 1 Timothy
+        base / "2TI.csv",   # 2 Timothy
+        base / "TIT.csv",   # Titus
+        base / "PHM.csv",   # Philemon
+        base / "HEB.csv",   # Hebrews
+        base / "JAM.csv",   # James
+        base / "1PE.csv",   # 1 Peter
+        base / "2PE.csv",   # 2 Peter
+        base / "1JO.csv",   # 1 John
+        base / "2JO.csv",   # 2 John
+        base / "3JO.csv",   # 3 John
+        base / "JUD.csv",   # Jude
+        base / "REV.csv"    # Revelation
+    ]
+
+# Betacode words with Strong's numbers and Robinson-Pierpont parsing codes for each book
+def strongs_book_paths():
+    base = SOURCES_DIR / "byzantine-majority-text-master" / "source" / "Strongs"
+    return [
+        base / "01_MAT.bp5",   # Matthew
+        base / "02_MAR.bp5",   # Mark
+        base / "03_LUK.bp5",   # Luke
+        base / "04_JOH.bp5",   # John
+        base / "05_ACT.bp5",   # Acts
+        base / "06_ROM.bp5",   # Romans
+        base / "07_1CO.bp5",   # 1 Corinthians
+        base / "08_2CO.bp5",   # 2 Corinthians
+        base / "09_GAL.bp5",   # Galatians
+        base / "10_EPH.bp5",   # Ephesians
+        base / "11_PHP.bp5",   # Philippians
+        base / "12_COL.bp5",   # Colossians
+        base / "13_1TH.bp5",   # 1 Thessalonians
+        base / "14_2TH.bp5",   # 2 Thessalonians
+        base / "15_1TI.bp5",   # 1 Timothy
+        base / "16_2TI.bp5",   # 2 Timothy
+        base / "17_TIT.bp5",   # Titus
+        base / "18_PHM.bp5",   # Philemon
+        base / "19_HEB.bp5",   # Hebrews
+        base / "20_JAM.bp5",   # James
+        base / "21_1PE.bp5",   # 1 Peter
+        base / "22_2PE.bp5",   # 2 Peter
+        base / "23_1JO.bp5",   # 1 John
+        base / "24_2JO.bp5",   # 2 John
+        base / "25_3JO.bp5",   # 3 John
+        base / "26_JUD.bp5",   # Jude
+        base / "27_REV.bp5"    # Revelation
+    ]
+
+# SBLGNT text of each book
+def sbl_book_paths():
+    base = SOURCES_DIR / "SBLGNT-master" / "data" / "sblgnt" / "text"
+    return [
+        base / "Matt.txt",
+        base / "Mark.txt",
+        base / "Luke.txt",
+        base / "John.txt",
+        base / "Acts.txt",
+        base / "Rom.txt",
+        base / "1Cor.txt",
+        base / "2Cor.txt",
+        base / "Gal.txt",
+        base / "Eph.txt",
+        base / "Phil.txt",
+        base / "Col.txt",
+        base / "1Thess.txt",
+        base / "2Thess.txt",
+        base / "1Tim.txt",
+        base / "2Tim.txt",
+        base / "Titus.txt",
+        base / "Phlm.txt",
+        base / "Heb.txt",
+        base / "Jas.txt",
+        base / "1Pet.txt",
+        base / "2Pet.txt",
+        base / "1John.txt",
+        base / "2John.txt",
+        base / "3John.txt",
+        base / "Jude.txt",
+        base / "Rev.txt"
+    ]
+
+# Strong's definitions from Matthias Müller
+def strongs_definitions_path():
+    return SOURCES_DIR / "Greek Strongs from Matthias Mueller 20250623.csv"
+
+def betacode_table_paths():
+    base = TOOLS_DIR / "betacode_translation"
+    return [base / "betacode_alphabet.csv", base / "betacode_diacritics.csv", base / "betacode_punctuation.csv"]
+
+def trait_table_paths():
+    return sorted((TOOLS_DIR / "rp_code_trait_tables").glob("*.csv"))
+
+# Known differences between unicode_bible and external_unicode_bible that don't fail the build
+def unicode_mismatch_allowlist_path():
+    return ROOT_DIR / "verification" / "unicode_mismatch_allowlist.csv"
+
+
+# SOURCE LEXERS
+
+# A token read from a source text - kind is one of the *_TOKEN names below and line is the line it starts on
+SourceToken = namedtuple("SourceToken", ["kind", "value", "line"])
+
+VERSE_TOKEN = "verse"             # value is (chapter, verse)
+WORD_TOKEN = "word"
+STRONGS_TOKEN = "strongs"         # value is the Strong's number, or -1 if it isn't a number
+CODE_TOKEN = "code"               # Robinson-Pierpont parsing code like {V-AAI-3S}
+ALT_STRONGS_TOKEN = "alt_strongs"
+ALT_CODE_TOKEN = "alt_code"
+
+SOURCE_WORD_RE = re.compile(r"\S+")
+# Variants are in between {}
+BETACODE_VARIANT_RE = re.compile(r"\{[^}]*\}")
+BETACODE_VERSE_RE = re.compile(r"(\d\d):(\d\d)")
+STRONGS_VERSE_RE = re.compile(r"(\d\d)\.(\d\d)")
+
+# Yields (word, line number) for every whitespace separated word of a file, one line at a time
+def source_words(file):
+    for line_number, line in enumerate(file, 1):
+        for match in SOURCE_WORD_RE.finditer(line):
+            yield match.group(), line_number
+
+# Yields the verse and word tokens of a CCAT betacode book, one line at a time
+# Removes ? which denotes the start of paragraphs, and variants (in between {}) - a variant can go over several lines,
+# so the lines of an unclosed variant are held until it closes
+def lex_betacode_book(file_path):
+    with open(file_path, "r", encoding="utf-8") as file:
+        held_text = None
+        held_line = None
+        for line_number, line in enumerate(file, 1):
+            text = line.strip().replace("?", "")
+            if held_text is not None:
+                text = held_text + " " + text
+                line_number = held_line
+            text = BETACODE_VARIANT_RE.sub("", text)
+            if "{" in text:
+                held_text = text
+                held_line = line_number
+                continue
+            held_text = None
+
+            for match in SOURCE_WORD_RE.finditer(text):
+                word = match.group()
+                # chapter and verse is in form Chapter:Verse
+                verse_match = BETACODE_VERSE_RE.fullmatch(word)
+                if verse_match:
+                    yield SourceToken(VERSE_TOKEN, (int(verse_match.group(1)), int(verse_match.group(2))), line_number)
+                else:
+                    yield SourceToken(WORD_TOKEN, word, line_number)
+
+        if held_text is not None:
+            raise ValueError(f"ERROR IN lex_betacode_book: {file_path}:{held_line}: variant opened with {{ is never closed")
+
+# Yields the verse, word, Strong's number and parsing code tokens of a Strong's book, where each word is written as
+# "word str_num {code}" or, if it has an alternate parsing, "word str_num {code} alt_str_num {alt_code}"
+def lex_strongs_book(file_path):
+    with open(file_path, "r", encoding="utf-8") as file:
+        words = source_words(file)
+        lookahead = deque()
+        while True:
+            while len(lookahead) < 5:
+                word = next(words, None)
+                if word is None:
+                    break
+                lookahead.append(word)
+            if not lookahead:
+                return
+
+            word, line_number = lookahead[0]
+            # chapter and verse is in form Chapter.Verse
+            verse_match = STRONGS_VERSE_RE.fullmatch(word)
+            if verse_match:
+                lookahead.popleft()
+                yield SourceToken(VERSE_TOKEN, (int(verse_match.group(1)), int(verse_match.group(2))), line_number)
+                continue
+
+            if len(lookahead) < 3:
+                raise ValueError(f"ERROR IN lex_strongs_book: {file_path}:{line_number}: expected word, Strong's number and parsing code, "
+                                 f"found {' '.join(word for word, _ in lookahead)} at end of file")
+            (word, word_line), (str_num, str_num_line), (code, code_line) = lookahead.popleft(), lookahead.popleft(), lookahead.popleft()
+            if "{" in word:
+                raise ValueError(f"ERROR IN lex_strongs_book: {file_path}:{word_line}: expected word, found parsing code {word}")
+            if "{" in str_num:
+                raise ValueError(f"ERROR IN lex_strongs_book: {file_path}:{str_num_line}: expected Strong's number after {word}, found parsing code {str_num}")
+            if "{" not in code:
+                raise ValueError(f"ERROR IN lex_strongs_book: {file_path}:{code_line}: expected parsing code after {word} {str_num}, found {code}")
+            yield SourceToken(WORD_TOKEN, word, word_line)
+            yield SourceToken(STRONGS_TOKEN, strongs_number(str_num), str_num_line)
+            yield SourceToken(CODE_TOKEN, code, code_line)
+
+            # Check if there's a "γη 1093 {N-NSF} 1093 {N-VSF}" situation
+            if len(lookahead) >= 2 and "{" in lookahead[1][0]:
+                (alt_str_num, alt_str_num_line), (alt_code, alt_code_line) = lookahead.popleft(), lookahead.popleft()
+                yield SourceToken(ALT_STRONGS_TOKEN, strongs_number(alt_str_num), alt_str_num_line)
+                yield SourceToken(ALT_CODE_TOKEN, alt_code, alt_code_line)
+
+def strongs_number(word):
+    try:
+        return int(word)
+    except ValueError:
+        return -1
+
+# Yields the verse and word tokens of an SBLGNT book - verses are marked like "Matt 1:1", and anything before
+# the first verse (the title) is skipped
+def lex_sbl_book(file_path):
+    book_name = file_path.name.split('.')[0]
+    in_text = False
+    with open(file_path, "r", encoding="utf-8") as file:
+        for word, line_number in source_words(file):
+            if word == book_name:
+                continue
+            if ':' in word and (word.replace(":", "")).isdigit():
+                chapter_verse = word.split(':')
+                if not chapter_verse[0] or not chapter_verse[1]:
+                    raise ValueError(f"ERROR IN lex_sbl_book: {file_path}:{line_number}: expected Chapter:Verse, found {word}")
+                in_text = True
+                yield SourceToken(VERSE_TOKEN, (int(chapter_verse[0]), int(chapter_verse[1])), line_number)
+            elif in_text:
+                yield SourceToken(WORD_TOKEN, word, line_number)
+
+
+# TOOL TABLES
+
+# The csvs in tools are a few dozen rows each, so they are read with the csv module instead of pandas, which takes
+# longer to import than the rest of a short build takes to run
+
+# Rows of a tool csv after its header row, as lists of strings ("" for an empty cell)
+def read_tool_csv(file_path):
+    with open(file_path, "r", encoding="utf-8-sig", newline="") as file:
+        return list(csv.reader(file))[1:]
+
+# Rows of a tool csv as dicts keyed by its header row
+def read_tool_dicts(file_path):
+    with open(file_path, "r", encoding="utf-8-sig", newline="") as file:
+        return list(csv.DictReader(file))
+
+# Betacode -> unicode letter for capitals (*A) and lowercase letters (A)
+# Skips ς which only occurs at the end of words - the program adds it later
+def betacode_alphabet_map():
+    rows = read_tool_csv(TOOLS_DIR / "betacode_translation" / "betacode_alphabet.csv")
+    del rows[44]
+    return {row[1]: row[0] for row in rows}
+
+# Lowercase betacode (a) -> unicode letter, from the Alt. LC columns of the alphabet, again without ς
+def betacode_lowercase_map():
+    rows = read_tool_csv(TOOLS_DIR / "betacode_translation" / "betacode_alphabet.csv")
+    del rows[19]
+    return {row[3]: row[2] for row in rows[:26] if row[3]}
+
+# Wikipedia uses — 	and _ for unicode and beta code respectively, byzantine-majority-text uses - for both as does this program
+def betacode_punctuation_map():
+    return {row[1]: row[0] for row in read_tool_csv(TOOLS_DIR / "betacode_translation" / "betacode_punctuation.csv")}
+
+# (diacritic, betacode, name) of every diacritic
+# Ignores last row which contains the coding for the breve, which is not in the ancient text
+def betacode_diacritics():
+    return [(row[0], row[1], row[2]) for row in read_tool_csv(TOOLS_DIR / "betacode_translation" / "betacode_diacritics.csv")[:-1]]
+
+# The diacritics, punctuation and footnote symbols of the SBLGNT, and the diacritic of every diacritic name
+def sbl_characters():
+    rows = read_tool_csv(TOOLS_DIR / "SBLGNT" / "characters.csv")
+    diacritics = {row[1] for row in rows if row[1]}
+    punctuation = {row[3] for row in rows if row[3]}
+    footnotes = {row[4] for row in rows if row[4]}
+    name_diacritic_map = {row[2]: row[1] for row in rows if row[2]}
+    return diacritics, punctuation, footnotes, name_diacritic_map
+
+# Reads rp_code_info.csv, long_trait_codes.csv and the rp_code_trait_tables into an RPCodeDecoder
+def make_rp_decoder():
+    trait_tables = {csv_file.stem: read_tool_dicts(csv_file) for csv_file in sorted((TOOLS_DIR / "rp_code_trait_tables").glob("*.csv"))}
+    return RPCodeDecoder(read_tool_dicts(TOOLS_DIR / "rp_code_info.csv"), read_tool_dicts(TOOLS_DIR / "long_trait_codes.csv"), trait_tables)
+
+
+# HELPER FUNCTIONS
+
+def simplify_betacode(word, remove_capitals = False, diacritic_list = None, punctuation_list = None):
+    if remove_capitals:
+        word = word.replace("*", "")
+    if diacritic_list is not None:
+        for key in diacritic_list:
+            word = word.replace(key, "")
+    if punctuation_list is not None:
+        for key in punctuation_list:
+            word = word.replace(key, "")
+    return word
+
+# dict for str.translate that turns every symbol missing from the betacode maps into "!" (to see if there are any errors)
+class BetacodeSymbolTable(dict):
+    def __missing__(self, key):
+        return "!"
+
+# Converts betacode words to unicode with lookup tables built once from the betacode maps
+# If has_capitals, the first * is joined with the letter after it, so *)IHSOU= gives Ἰησοῦ
+# σ becomes ς when it is the last letter of the word, and each distinct word is only converted once
+class BetacodeTransliterator:
+    def __init__(self, alphabet_map, diacritic_map = None, punctuation_map = None, has_capitals = False):
+        self.has_capitals = has_capitals
+        self.alphabet = set(alphabet_map)
+        self.final_sigmas = {betacode for betacode in self.alphabet if alphabet_map[betacode] == "σ"}
+
+        # Letters take priority over diacritics, and diacritics over punctuation
+        self.symbols = {}
+        for symbol_map in (punctuation_map, diacritic_map, alphabet_map):
+            if symbol_map is not None:
+                self.symbols.update(symbol_map)
+        self.table = BetacodeSymbolTable({ord(betacode): symbol for betacode, symbol in self.symbols.items() if len(betacode) == 1})
+        self.has_whitespace = any(re.search(r"\s", symbol) for symbol in self.symbols.values())
+
+        self.cache = {}
+
+    def convert(self, word):
+        unicode = self.cache.get(word)
+        if unicode is None:
+            unicode = self.convert_uncached(word)
+            self.cache[word] = unicode
+        return unicode
+
+    # Converts a whole list of words, such as every word of a book, at once - each distinct word is converted once
+    def convert_many(self, words):
+        cache = self.cache
+        for word in set(words).difference(cache):
+            cache[word] = self.convert_uncached(word)
+        return [cache[word] for word in words]
+
+    def convert_uncached(self, word):
+        if self.has_capitals:
+            star_index = word.find('*')
+            if star_index != -1:
+                return self.convert_capitalized(word, star_index)
+
+        last_letter_index = self.last_letter_index(word)
+        if last_letter_index is not None and word[last_letter_index] in self.final_sigmas:
+            letters = word[:last_letter_index].translate(self.table) + "ς" + word[last_letter_index + 1:].translate(self.table)
+        else:
+            letters = word.translate(self.table)
+        return self.normalize(letters)
+
+    def convert_capitalized(self, word, star_index):
+        if star_index >= len(word) - 1:
+            raise ValueError("ERROR IN capitalize: * APPEARS AT END OF WORD OR INCORRECT INDEX")
+        capital_index = next((i for i in range(star_index + 1, len(word)) if word[i] in self.alphabet), None)
+        if capital_index is None:
+            raise ValueError("ERROR IN capitalize: NO * IN WORD")
+
+        # The * and the capital letter become one symbol, like *A
+        symbols = list(word)
+        symbols[star_index] += symbols[capital_index]
+        del symbols[capital_index]
+
+        last_letter_index = self.last_letter_index(symbols)
+        letters = [self.symbols.get(symbol, "!") for symbol in symbols]
+        if last_letter_index is not None and symbols[last_letter_index] in self.final_sigmas:
+            letters[last_letter_index] = "ς"
+        return self.normalize(''.join(letters))
+
+    def last_letter_index(self, symbols):
+        for i in range(len(symbols) - 1, -1, -1):
+            if symbols[i] in self.alphabet:
+                return i
+        return None
+
+    def normalize(self, letters):
+        if self.has_whitespace:
+            letters = re.sub(r"\s+", "", letters)
+        return unicodedata.normalize('NFC', letters)
+
+
+def is_consonant(char):
+    vowels = "aeiouAEIOU"
+    return char.isalpha() and char not in vowels
+
+def is_after_consonant(word, index, alphabet_map):
+    for i in range(index - 1, -1, -1):
+        if word[i] in alphabet_map:
+            if is_consonant(word[i]):
+                return True
+            return False
+    raise ValueError("ERROR IN is_after_consonant: NO LETTERS BEFORE INDEX")
+
+# Compiles rp_code_info.csv, long_trait_codes.csv and the rp_code_trait_tables into plain dicts and tuples once,
+# then caches the decoding of every distinct code - there are only a few thousand distinct codes in the NT
+# info_rows, long_trait_rows and the rows of every trait table are the rows of their csvs as dicts
+class RPCodeDecoder:
+    def __init__(self, info_rows, long_trait_rows, trait_tables):
+        long_codes_by_table = defaultdict(list)
+        for long_trait_row in long_trait_rows:
+            long_codes_by_table[long_trait_row['origin_table']].append(long_trait_row['code'])
+
+        # abbreviation -> list of (pos, num traits, trait names, long trait codes) in rp_code_info.csv order
+        self.info = defaultdict(list)
+        for info_row in info_rows:
+            info_values = set(info_row.values())
+            long_codes = []
+            for origin_table in long_codes_by_table:
+                if origin_table in info_values:
+                    long_codes.extend(long_codes_by_table[origin_table])
+            num_traits = int(info_row["num traits"])
+            traits = tuple(info_row["trait " + str(j)] for j in range(1, num_traits + 1))
+            self.info[info_row['abbreviation']].append((info_row['pos'], num_traits, traits, tuple(long_codes)))
+
+        # trait table name -> {abbreviation: trait}, keeping the first row for repeated abbreviations
+        self.trait_tables = {}
+        for name, rows in trait_tables.items():
+            table = {}
+            for row in rows:
+                table.setdefault(row['Abbreviation'], row[name])
+            self.trait_tables[name] = table
+
+        self.cache = {}
+
+    # Returns the same { "pos": ..., "dict": ... } structure for every code - the dict is a fresh copy so callers can add alt_ keys
+    def decode(self, code):
+        decoding = self.cache.get(code)
+        if decoding is None:
+            decoding = self.decode_uncached(code)
+            self.cache[code] = decoding
+        rp_pos, traits = decoding
+        return { "pos": rp_pos, "dict": defaultdict(lambda: "", traits) }
+
+    def decode_uncached(self, code):
+        rp_dict = {}
+        rp_pos = "!"
+        code = code.replace("{", "")
+        code = code.replace("}", "")
+        code_parts = code.split("-")
+        info  = "".join(code_parts[1:])
+        possible_traits = []
+        trait_code_list = []
+
+        # All possible trait sequences for this part of speech
+        for pos, num_traits, traits, long_codes in self.info.get(code_parts[0], ()):
+            # making an element of trait_code_list, a list of lists of abbreviations for traits
+            trait_codes = []
+            j = 0
+            while j < len(info):
+                matched = False
+                for sub in long_codes:
+                    if info.startswith(sub, j):
+                        trait_codes.append(sub)
+                        j += len(sub)
+                        matched = True
+                        break
+                if not matched:
+                    trait_codes.append(info[j])
+                    j += 1
+            if len(trait_codes) != num_traits:
+                continue
+            # Append to trait_code_list after above statement to prevent adding an invalid set of codes
+            trait_code_list.append(trait_codes)
+            rp_pos = pos
+            possible_traits.append(traits)
+
+        for j in range(0, len(possible_traits)):
+            valid = True
+            for k in range(0, len(possible_traits[j])):
+                trait = self.trait_tables[possible_traits[j][k]].get(trait_code_list[j][k])
+                if trait is not None:
+                    rp_dict[possible_traits[j][k]] = trait
                 else:
-                    cursor.execute('''
-                            INSERT INTO betacode_bible (word, book, chapter, verse, word_index, total_word_index)
-                            VALUES (?, ?, ?, ?, ?, ?)
-                            ''',
-                            (word, book, chapter, verse, word_index, total_word_index)
-                            )
-                    word_index += 1
-                    total_word_index += 1
-        book_counter += 1
-
-def make_unicode_bible(cursor):
-    cursor.execute('DROP TABLE IF EXISTS unicode_bible')
-
-    cursor.execute('''CREATE TABLE IF NOT EXISTS unicode_bible (
+                    rp_dict[possible_traits[j][k]] = "Unknown"
+                    valid = False
+
+            if valid:
+                for k, v in rp_dict.items():
+                    if str(v).lower() == "unknown":
+                        rp_dict[k] = ""
+                break
+
+        return (rp_pos, rp_dict)
+
+
+# NORMALIZATION
+
+# Turns Greek words into the forms the tables compare them on, with str.translate tables built once
+# diacritics are the combining marks taken off for mono and unaccented forms, grave accents become acute accents in
+# std_poly forms, and removed_characters (punctuation, footnote symbols) and digits are taken off by clean
+# Each method keeps the last cache_size distinct words it was given, and counts its hits and misses
+class GreekNormalizer:
+    def __init__(self, diacritics, grave_accent, acute_accent, removed_characters = (), cache_size = NORMALIZER_CACHE_SIZE):
+        self.diacritic_table = str.maketrans("", "", "".join(diacritics))
+        self.accent_table = str.maketrans(grave_accent, acute_accent)
+        self.removed_table = str.maketrans("", "", "".join(removed_characters))
+
+        self.clean = lru_cache(maxsize=cache_size)(self.clean_uncached)
+        self.mono_LC = lru_cache(maxsize=cache_size)(self.mono_LC_uncached)
+        self.unaccented = lru_cache(maxsize=cache_size)(self.unaccented_uncached)
+        self.std_poly = lru_cache(maxsize=cache_size)(self.std_poly_uncached)
+
+    def clean_uncached(self, word):
+        return ''.join(c for c in word.translate(self.removed_table) if not c.isdigit())
+
+    # Lowercase with no diacritics
+    def mono_LC_uncached(self, word):
+        return unicodedata.normalize('NFC', unicodedata.normalize('NFD', word.lower()).translate(self.diacritic_table))
+
+    # Same case with no diacritics
+    def unaccented_uncached(self, word):
+        return unicodedata.normalize('NFC', unicodedata.normalize('NFD', word).translate(self.diacritic_table))
+
+    # converts to standard polytonic form - no capitals unless word is a proper noun, keep accents but grave accents turned into accute
+    def std_poly_uncached(self, word, is_proper_noun = False):
+        if is_proper_noun:
+            word = word[0] + word[1:].lower()
+        else:
+            word = word.lower()
+        return unicodedata.normalize('NFC', unicodedata.normalize('NFD', word).translate(self.accent_table))
+
+    # (hits, misses) of all the methods together
+    def counts(self):
+        hits = 0
+        misses = 0
+        for method in (self.clean, self.mono_LC, self.unaccented, self.std_poly):
+            info = method.cache_info()
+            hits += info.hits
+            misses += info.misses
+        return hits, misses
+
+# The GreekNormalizers of a build - stages asking for the same characters share one normalizer and its caches
+class NormalizerPool:
+    def __init__(self, cache_size = NORMALIZER_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.normalizers = {}
+
+    def get(self, diacritics, grave_accent, acute_accent, removed_characters = ()):
+        key = (frozenset(diacritics), grave_accent, acute_accent, frozenset(removed_characters))
+        normalizer = self.normalizers.get(key)
+        if normalizer is None:
+            normalizer = GreekNormalizer(diacritics, grave_accent, acute_accent, removed_characters, self.cache_size)
+            self.normalizers[key] = normalizer
+        return normalizer
+
+    # (hits, misses) of every normalizer together
+    def counts(self):
+        hits = 0
+        misses = 0
+        for normalizer in self.normalizers.values():
+            normalizer_hits, normalizer_misses = normalizer.counts()
+            hits += normalizer_hits
+            misses += normalizer_misses
+        return hits, misses
+
+# BULK LOADING
+
+# Buffers the rows of each INSERT statement and sends them with executemany in batches of batch_size
+# Rows of the same statement are inserted in the order they were given, so AUTOINCREMENT ids are unchanged
+class BulkWriter:
+    def __init__(self, cursor, batch_size = BULK_BATCH_SIZE):
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.buffers = {}
+
+    def execute(self, sql, row):
+        buffer = self.buffers.get(sql)
+        if buffer is None:
+            buffer = []
+            self.buffers[sql] = buffer
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            self.cursor.executemany(sql, buffer)
+            buffer.clear()
+
+    def flush(self):
+        for sql, buffer in self.buffers.items():
+            if buffer:
+                self.cursor.executemany(sql, buffer)
+                buffer.clear()
+
+# Sets BUILD_PRAGMAS for the duration of the build and restores the connection's previous settings afterwards
+@contextmanager
+def build_pragmas(conn):
+    if conn.in_transaction:
+        conn.commit()
+    previous = {name: conn.execute(f"PRAGMA {name}").fetchone()[0] for name in BUILD_PRAGMAS}
+    for name, value in BUILD_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    try:
+        yield
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        for name, value in previous.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+
+# PARALLEL INGESTION
+
+# Calls function on every book file, in jobs worker processes if jobs > 1
+# The results always come back in book order, so total_word_index is the same as in a serial build
+def map_books(function, file_paths, jobs = 1):
+    if jobs <= 1:
+        yield from map(function, file_paths)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from executor.map(function, file_paths)
+
+
+# BOOK SELECTION
+
+# books is None when every book is built, or the abbreviations of the only books to rebuild with --books
+# The rows of a rebuilt book are deleted and written again with the same total_word_index (and ids) as before,
+# so the rows of the other books don't change
+
+# (book_id, book) of the selected books in canonical order - book_id is the id of the book in books
+def selected_books(books):
+    return [(book_id, book) for book_id, book in enumerate(book_abbrevs, 1) if books is None or book in books]
+
+# The files of the selected books, from a list of files in book_abbrevs order
+def selected_paths(file_paths, books):
+    return [file_path for file_path, book in zip(file_paths, book_abbrevs) if books is None or book in books]
+
+# Drops a table so it can be made again, or when only some books are rebuilt, deletes just their rows
+# condition selects the rows of one book, with a ? for its abbreviation - or for its book_id if by_id
+def clear_books(cursor, table, books, condition = "book = ?", by_id = False):
+    if books is None:
+        cursor.execute(f'DROP TABLE IF EXISTS {table}')
+        return
+    cursor.executemany(f"DELETE FROM {table} WHERE {condition}",
+                       [(book_id if by_id else book,) for book_id, book in selected_books(books)])
+
+# A book rebuilt on its own keeps the total_word_index of its words, so it can't gain or lose words - the
+# total_word_index of every book after it would change
+def check_book_words(function_name, book, words, expected_words):
+    if words != expected_words:
+        raise ValueError(f"ERROR IN {function_name}: {book} HAS {words} WORDS INSTEAD OF {expected_words}, "
+                         "SO IT CAN ONLY BE REBUILT WITH EVERY BOOK (WITHOUT --books)")
+
+
+# CORPUS
+
+# Each distinct string is stored once and the words refer to it by its index
+class StringTable:
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+
+    def intern(self, string):
+        string_id = self.ids.get(string)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.ids[string] = string_id
+            self.strings.append(string)
+        return string_id
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+    def __len__(self):
+        return len(self.strings)
+
+# str_nums value of a word without a parsed word - strongs_number gives -1 for a Strong's number that isn't a number
+NO_STR_NUM = -2
+
+# The words of the Byzantine Majority Text in total_word_index order as array columns - position i is the word with
+# total_word_index i + 1, which is also its word_instances id
+# The instances stage fills the references and unicode forms as it writes word_instances, and the parsed stage the
+# Strong's number and unicode form of the parsed word of every word. The parsed, align and search stages read the
+# columns instead of joining word_instances and parsed_words again
+# The forms are interned in one StringTable, where id 0 is None (no parsed word). Columns of a stage that didn't run
+# in this build, or only rebuilt some books, are loaded from its table the first time they're needed
+class Corpus:
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.forms = StringTable()
+        self.forms.intern(None)
+        self.clear_words()
+
+    # From word_instances - book_ids are the ids in books (book_abbrevs index + 1)
+    def clear_words(self):
+        self.has_words = False
+        self.book_ids = array('B')
+        self.chapters = array('H')
+        self.verses = array('H')
+        self.word_indexes = array('H')
+        self.unicode_ids = array('I')
+        self.clear_parsings()
+
+    def add_word(self, book_id, chapter, verse, word_index, unicode):
+        self.book_ids.append(book_id)
+        self.chapters.append(chapter)
+        self.verses.append(verse)
+        self.word_indexes.append(word_index)
+        self.unicode_ids.append(self.forms.intern(unicode))
+
+    def load_words(self):
+        if self.has_words:
+            return
+        self.clear_words()
+        book_ids = {book: book_id for book_id, book in enumerate(book_abbrevs, 1)}
+        self.cursor.execute("SELECT book, chapter, verse, word_index, unicode FROM word_instances ORDER BY total_word_index")
+        for rows in iter(lambda: self.cursor.fetchmany(BULK_BATCH_SIZE), []):
+            for book, chapter, verse, word_index, unicode in rows:
+                self.add_word(book_ids[book], chapter, verse, word_index, unicode)
+        self.has_words = True
+
+    # From parsed_words
+    def clear_parsings(self):
+        self.has_parsings = False
+        self.str_nums = array('i')
+        self.parsed_ids = array('I')
+
+    # Starts the parsed columns with no parsed word for any word
+    def start_parsings(self):
+        self.load_words()
+        self.str_nums = array('i', [NO_STR_NUM]) * len(self)
+        self.parsed_ids = array('I', [0]) * len(self)
+
+    def set_parsing(self, position, str_num, unicode):
+        self.str_nums[position] = str_num
+        self.parsed_ids[position] = self.forms.intern(unicode)
+
+    def load_parsings(self):
+        if self.has_parsings:
+            return
+        self.start_parsings()
+        self.cursor.execute("SELECT instance_id, str_num, unicode FROM parsed_words WHERE instance_id IS NOT NULL ORDER BY book_id, id")
+        for rows in iter(lambda: self.cursor.fetchmany(BULK_BATCH_SIZE), []):
+            for instance_id, str_num, unicode in rows:
+                self.set_parsing(instance_id - 1, str_num, unicode)
+        self.has_parsings = True
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    # The positions of the words of a book, which are all together since the words are in book order
+    def book_positions(self, book_id):
+        return range(bisect_left(self.book_ids, book_id), bisect_right(self.book_ids, book_id))
+
+    # The Strong's number of the parsed word of a word, or None if it has none
+    def str_num(self, position):
+        str_num = self.str_nums[position]
+        return None if str_num == NO_STR_NUM else str_num
+
+
+# DATABASE FUNCTIONS
+
+# Returns the words of one CCAT book as (word, chapter, verse, word_index) rows
+def read_betacode_book(file_path):
+    rows = []
+    chapter = 1
+    verse = 1
+    word_index = 1
+    for token in lex_betacode_book(file_path):
+        if token.kind == VERSE_TOKEN:
+            if token.value != (chapter, verse):
+                word_index = 1
+            chapter, verse = token.value
+        else:
+            rows.append((token.value, chapter, verse, word_index))
+            word_index += 1
+    return rows
+
+# Reads each CCAT book once and writes every form of its words in one pass: the source betacode and its unicode, which
+# keep the punctuation, and the betacode, mono_LC, unicode and std_poly_LC of the word without it
+# betacode_bible and unicode_bible are views of the source columns, so their words aren't stored and read back again
+# The id of every word instance is its total_word_index
+def make_word_instances(cursor, corpus, normalizers, jobs = 1, books = None):
+    # (first total_word_index, words) of every rebuilt book, read before its rows are deleted
+    book_words = {}
+    # The corpus is filled as the words are written, or loaded again when only some books are rebuilt
+    corpus.clear_words()
+    if books is None:
+        drop_table_or_view(cursor, 'betacode_bible')
+        drop_table_or_view(cursor, 'unicode_bible')
+    else:
+        for _, book in selected_books(books):
+            cursor.execute("SELECT MIN(total_word_index), COUNT(*) FROM word_instances WHERE book = ?", (book,))
+            book_words[book] = cursor.fetchone()
+
+    clear_books(cursor, 'word_instances', books)
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS word_instances (
                    id INTEGER PRIMARY KEY AUTOINCREMENT,
                    word VARCHAR(45),
+                   mono_LC VARCHAR(45),
+                   unicode VARCHAR(45),
+                   std_poly_LC VARCHAR(45),
                    book VARCHAR(45),
                    chapter INTEGER,
                    verse INTEGER,
                    word_index INTEGER,
-                   total_word_index INTEGER
+                   total_word_index INTEGER,
+                   source_betacode VARCHAR(45),
+                   source_unicode VARCHAR(45)
                    )''')
-    
-    # Skips row 45 because that contains ς which only occurs at the end of words - the program adds it later
-    df = pd.read_csv((Path(__file__).parent / "tools" / "betacode_translation" / "betacode_alphabet.csv").resolve(), usecols=[0, 1], skiprows=[45])
-    df.columns = ['letter', 'betacode']
-    alphabet_map = dict(zip(df["betacode"], df["letter"]))
-
-    # Wikipedia uses — 	and _ for unicode and beta code respectively, byzantine-majority-text uses - for both as does this program
-    df = pd.read_csv((Path(__file__).parent / "tools" / "betacode_translation" / "betacode_punctuation.csv").resolve(), usecols=[0, 1])
-    df.columns = ['punctuation', 'betacode']
-    punctuation_map = dict(zip(df["betacode"], df["punctuation"]))
-
-    df = pd.read_csv((Path(__file__).parent / "tools" / "betacode_translation" / "betacode_diacritics.csv").resolve(), usecols=[0, 1])
-    # Ignores last row which contains the coding for the breve, which is not in the ancient text
-    df = df[:-1]
-    df.columns = ['diacritic', 'betacode']
-    diacritic_map = dict(zip(df["betacode"], df["diacritic"]))
-
-
-    cursor.execute("SELECT word, book, chapter, verse, word_index, total_word_index FROM betacode_bible")
-
-    rows = cursor.fetchall()
-    for row in rows:
-        old_word = row[0]
-        word = betacode_to_unicode(old_word, alphabet_map, diacritic_map, punctuation_map, True)
-
-        book = row[1]
-        chapter = row[2]
-        verse = row[3]
-        word_index = row[4]
-        total_word_index = row[5]
-
-        cursor.execute('''INSERT INTO unicode_bible (word, book, chapter, verse, word_index, total_word_index)
-                            VALUES (?, ?, ?, ?, ?, ?)
-                        ''',
-                        (word, book, chapter, verse, word_index, total_word_index)
+
+    cursor.execute('''CREATE VIEW IF NOT EXISTS betacode_bible AS
+                   SELECT id, source_betacode AS word, book, chapter, verse, word_index, total_word_index
+                   FROM word_instances''')
+
+    cursor.execute('''CREATE VIEW IF NOT EXISTS unicode_bible AS
+                   SELECT id, source_unicode AS word, book, chapter, verse, word_index, total_word_index
+                   FROM word_instances''')
+
+    alphabet_map = betacode_alphabet_map()
+    punctuation_map = betacode_punctuation_map()
+    diacritics = betacode_diacritics()
+    diacritic_map = {betacode: diacritic for diacritic, betacode, _ in diacritics}
+    name_diacritic_map = {name: diacritic for diacritic, _, name in diacritics}
+
+    normalizer = normalizers.get(diacritic_map.values(), name_diacritic_map["Grave accent"], name_diacritic_map["Acute accent"])
+
+    source_transliterator = BetacodeTransliterator(alphabet_map, diacritic_map, punctuation_map, True)
+    transliterator = BetacodeTransliterator(alphabet_map, diacritic_map, None, True)
+
+    # Each distinct source form is only simplified once
+    betacode_forms = {}
+    def simplified_forms(source_betacode):
+        forms = betacode_forms.get(source_betacode)
+        if forms is None:
+            # Get rid of punctuation
+            word = simplify_betacode(source_betacode, False, None, punctuation_map.keys())
+
+            # Get rid of diacritics and capitals - also do .lower() because the letters in parsed_word_info are lowercase,
+            # whereas betacode letters have * to denote a capital
+            mono_LC = simplify_betacode(word, True, diacritic_map.keys()).lower()
+
+            forms = (word, mono_LC)
+            betacode_forms[source_betacode] = forms
+        return forms
+
+    writer = BulkWriter(cursor)
+    first_total_word_index = 1
+    for (book_id, book), rows in zip(selected_books(books), map_books(read_betacode_book, selected_paths(betacode_book_paths(), books), jobs)):
+        if books is not None:
+            first_total_word_index, words = book_words[book]
+            check_book_words("make_word_instances", book, len(rows), words)
+
+        # The words of the whole book are converted at once
+        source_betacodes = [row[0] for row in rows]
+        forms = [simplified_forms(source_betacode) for source_betacode in source_betacodes]
+        source_unicodes = source_transliterator.convert_many(source_betacodes)
+        unicodes = transliterator.convert_many([word for word, _ in forms])
+
+        for position, (source_betacode, chapter, verse, word_index) in enumerate(rows):
+            total_word_index = first_total_word_index + position
+            word, mono_LC = forms[position]
+            source_unicode = source_unicodes[position]
+            unicode = unicodes[position]
+            std_poly_LC = normalizer.std_poly(unicode, False)
+
+            writer.execute('''
+                    INSERT INTO word_instances (id, word, mono_LC, unicode, std_poly_LC, book, chapter, verse, word_index, total_word_index,
+                                                source_betacode, source_unicode)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''',
+                    (total_word_index, word, mono_LC, unicode, std_poly_LC, book, chapter, verse, word_index, total_word_index,
+                     source_betacode, source_unicode)
                     )
+            if books is None:
+                corpus.add_word(book_id, chapter, verse, word_index, unicode)
+        first_total_word_index += len(rows)
+
+    writer.flush()
+    corpus.has_words = books is None
 
+# The verses of every book are split into words in one pass over a single DataFrame, with word_index numbered by
+# verse and total_word_index across the books
 def make_external_unicode_bible(cursor):
     cursor.execute('DROP TABLE IF EXISTS external_unicode_bible')
 
@@ -347,155 +977,231 @@ def make_external_unicode_bible(cursor):
                    total_word_index INTEGER
                    )''')
     
-    base = Path(Path(__file__).parent / ".." / "external_sources" / "byzantine-majority-text-master" / "csv-unicode" / "ccat" / "no-variants")
-    # Makes list of all csv files in folder: book_dfs = [pd.read_csv(file) for file in folder_path.glob("*.csv")]
-    book_dfs = [
-        pd.read_csv(base / "MAT.csv"),   # Matthew
-        pd.read_csv(base / "MAR.csv"),   # Mark
-        pd.read_csv(base / "LUK.csv"),   # Luke
-        pd.read_csv(base / "JOH.csv"),   # John
-        pd.read_csv(base / "ACT.csv"),   # Acts
-        pd.read_csv(base / "ROM.csv"),   # Romans
-        pd.read_csv(base / "1CO.csv"),   # 1 Corinthians
-        pd.read_csv(base / "2CO.csv"),   # 2 Corinthians
-        pd.read_csv(base / "GAL.csv"),   # Galatians
-        pd.read_csv(base / "EPH.csv"),   # Ephesians
-        pd.read_csv(base / "PHP.csv"),   # Philippians
-        pd.read_csv(base / "COL.csv"),   # Colossians
-        pd.read_csv(base / "1TH.csv"),   # 1 Thessalonians
-        pd.read_csv(base / "2TH.csv"),   # 2 Thessalonians
-        pd.read_csv(base / "1TI.csv"),   # 1 Timothy
-        pd.read_csv(base / "2TI.csv"),   # 2 Timothy
-        pd.read_csv(base / "TIT.csv"),   # Titus
-        pd.read_csv(base / "PHM.csv"),   # Philemon
-        pd.read_csv(base / "HEB.csv"),   # Hebrews
-        pd.read_csv(base / "JAM.csv"),   # James
-        pd.read_csv(base / "1PE.csv"),   # 1 Peter
-        pd.read_csv(base / "2PE.csv"),   # 2 Peter
-        pd.read_csv(base / "1JO.csv"),   # 1 John
-        pd.read_csv(base / "2JO.csv"),   # 2 John
-        pd.read_csv(base / "3JO.csv"),   # 3 John
-        pd.read_csv(base / "JUD.csv"),   # Jude
-        pd.read_csv(base / "REV.csv")    # Revelation
-    ]
-
-    book_counter = 0
-    total_word_index = 1
-    for df in book_dfs:
-        for _, row in df.iterrows():
-            book = book_abbrevs[book_counter]
-            chapter = int(row["chapter"])
-            verse = int(row["verse"])
-            text = clean_unicode(row["text"])
-            words = text.split()
-            word_index = 1
-            for word in words:
-                cursor.execute('''
-                               INSERT INTO external_unicode_bible (word, book, chapter, verse, word_index, total_word_index)
-                               VALUES (?, ?, ?, ?, ?, ?)
-                               ''',
-                               (word, book, chapter, verse, word_index, total_word_index)
-                            )
-                word_index += 1
-                total_word_index += 1
-                
-        book_counter += 1
-
-def make_word_instances(cursor):
-    cursor.execute('DROP TABLE IF EXISTS word_instances')
-
-    cursor.execute('''CREATE TABLE IF NOT EXISTS word_instances (
+    # pandas is only imported by the stages that read whole source tables with it - see TOOL TABLES
+    import pandas as pd
+
+    verses = pd.concat([pd.read_csv(file_path, usecols=["chapter", "verse", "text"]).assign(book=book)
+                        for book, file_path in zip(book_abbrevs, external_unicode_book_paths())], ignore_index=True)
+
+    # ¶, which denotes the start of paragraphs, is removed, and any whitespace separates words - line breaks included, so
+    # words at the end and beginning of lines aren't stuck together
+    # Each word keeps the index of its verse, which numbers the words of the verse
+    words = verses.assign(word=verses["text"].str.replace("¶", "", regex=False).str.split()).explode("word")
+    words = words[words["word"].notna()]
+    word_indexes = words.groupby(level=0).cumcount() + 1
+
+    cursor.executemany('''INSERT INTO external_unicode_bible (word, book, chapter, verse, word_index, total_word_index)
+                       VALUES (?, ?, ?, ?, ?, ?)''',
+                       zip(words["word"].tolist(), words["book"].tolist(), words["chapter"].tolist(), words["verse"].tolist(),
+                           word_indexes.tolist(), range(1, len(words) + 1)))
+
+# The code points of two words where they differ, after the start and end they have in common, as "U+XXXX" lists
+# Both are compared in NFD so a differing accent shows as the accent alone
+def differing_code_points(word, other_word):
+    word = unicodedata.normalize("NFD", word or "")
+    other_word = unicodedata.normalize("NFD", other_word or "")
+    start = 0
+    while start < min(len(word), len(other_word)) and word[start] == other_word[start]:
+        start += 1
+    end = 0
+    while end < min(len(word), len(other_word)) - start and word[-1 - end] == other_word[-1 - end]:
+        end += 1
+    return (" ".join(f"U+{ord(char):04X}" for char in word[start:len(word) - end]),
+            " ".join(f"U+{ord(char):04X}" for char in other_word[start:len(other_word) - end]))
+
+# Pairs the words of one verse of unicode_bible, as (total_word_index, word_index, word) rows, with those of
+# external_unicode_bible, as (word_index, word) rows, on their NFC forms with difflib - words that only one verse has are
+# paired with None, so a missing word doesn't shift the words after it
+# Returns the pairs that differ as (total_word_index, book, chapter, verse, word_index, unicode_word, external_word)
+# rows - word_index is that of the unicode_bible word, or of the external_unicode_bible word if it is alone
+def differing_verse_words(book, chapter, verse, unicode_rows, external_rows, nfc_forms):
+    matcher = SequenceMatcher(None, [nfc_forms[word] for _, _, word in unicode_rows], [nfc_forms[word] for _, word in external_rows],
+                              autojunk=False)
+    rows = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        for k in range(max(i2 - i1, j2 - j1)):
+            total_word_index, word_index, unicode_word = unicode_rows[i1 + k] if i1 + k < i2 else (None, None, None)
+            external_word_index, external_word = external_rows[j1 + k] if j1 + k < j2 else (None, None)
+            if word_index is None:
+                word_index = external_word_index
+            rows.append((total_word_index, book, chapter, verse, word_index, unicode_word, external_word))
+    return rows
+
+# Checks the betacode to unicode conversion against the csv-unicode text of byzantine-majority-text, which replaces
+# checking it by hand in a spreadsheet
+# The words of unicode_bible and external_unicode_bible are matched by book, chapter, verse and word_index and compared
+# in NFC, so different encodings of the same letter (like the tonos and oxia acutes) match - every word that still
+# differs, or that only one of them has, goes in unicode_mismatches with the code points where the two forms differ
+# The verses with differences are paired again word by word (see differing_verse_words), so a word only one of them has
+# gives one row rather than shifting the words after it
+# total_word_index is that of the unicode_bible word, or null for a word only external_unicode_bible has
+# A mismatch whose reference, unicode_word and external_word are a row of the allow-list is marked allowed
+def make_unicode_verification(cursor):
+    cursor.execute('DROP TABLE IF EXISTS unicode_mismatches')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS unicode_mismatches (
                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                   word VARCHAR(45),
-                   mono_LC VARCHAR(45),
-                   unicode VARCHAR(45),
-                   std_poly_LC VARCHAR(45),
+                   total_word_index INTEGER,
                    book VARCHAR(45),
                    chapter INTEGER,
                    verse INTEGER,
                    word_index INTEGER,
-                   total_word_index INTEGER
+                   unicode_word VARCHAR(45),
+                   external_word VARCHAR(45),
+                   unicode_code_points VARCHAR(255),
+                   external_code_points VARCHAR(255),
+                   allowed INTEGER
                    )''')
-    
-    # Skips row 45 because that contains ς which only occurs at the end of words - the program adds it later
-    df = pd.read_csv((Path(__file__).parent / "tools" / "betacode_translation" / "betacode_alphabet.csv").resolve(), usecols=[0, 1], skiprows=[45])
-    df.columns = ['letter', 'betacode']
-    alphabet_map = dict(zip(df["betacode"], df["letter"]))
-
-    df = pd.read_csv((Path(__file__).parent / "tools" / "betacode_translation" / "betacode_punctuation.csv").resolve(), usecols=[0, 1])
-    df.columns = ['punctuation', 'betacode']
-    punctuation_map = dict(zip(df["betacode"], df['punctuation']))
-
-    df = pd.read_csv((Path(__file__).parent / "tools" / "betacode_translation" / "betacode_diacritics.csv").resolve(), usecols=[0, 1, 2])
-    # Ignores last row which contains the coding for the breve, which is not in the ancient text
-    df = df[:-1]
-    df.columns = ['diacritic', 'betacode', 'name']
-    diacritic_map =  dict(zip(df["betacode"], df['diacritic']))
-
-    name_diacritic_map =  dict(zip(df["name"], df['diacritic']))
-
-    cursor.execute("SELECT word, book, chapter, verse, word_index, total_word_index FROM betacode_bible")
-    rows = cursor.fetchall()
-
-    total_word_index = 1
-
-    for row in rows:
-        # Get rid of punctuation
-        word = simplify_betacode(row[0], False, None, punctuation_map.keys())
-
-        # Get rid of diacritics and capitals - also do .lower() because the letters in parsed_word_info are lowercase,
-        # whereas betacode_bible letters have * to denote a capital
-        mono_LC = simplify_betacode(word, True, diacritic_map.keys()).lower()
-
-        unicode = betacode_to_unicode(word, alphabet_map, diacritic_map, None, True)
-
-        std_poly_LC = to_std_poly_form(unicode, False, name_diacritic_map)
-
-        book = row[1]
-        chapter = row[2]
-        verse = row[3]
-        word_index = row[4]
-        total_word_index = row[5]
-
-        cursor.execute('''
-                    INSERT INTO word_instances (word, mono_LC, unicode, std_poly_LC, book, chapter, verse, word_index, total_word_index)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''',
-                    (word, mono_LC, unicode, std_poly_LC, book, chapter, verse, word_index, total_word_index)
-                    )
 
+    import pandas as pd
+
+    reference = ["book", "chapter", "verse", "word_index"]
+    unicode_words = pd.read_sql_query('''SELECT id AS total_word_index, book, chapter, verse, word_index, word AS unicode_word
+                                      FROM unicode_bible''', cursor.connection)
+    external_words = pd.read_sql_query("SELECT book, chapter, verse, word_index, word AS external_word FROM external_unicode_bible",
+                                       cursor.connection)
+    words = unicode_words.merge(external_words, how="outer", on=reference)
+
+    # Each distinct form is only normalized once
+    forms = pd.concat([words["unicode_word"], words["external_word"]]).dropna().unique()
+    nfc_forms = {form: unicodedata.normalize("NFC", form) for form in forms}
+    mismatches = words[words["unicode_word"].map(nfc_forms) != words["external_word"].map(nfc_forms)]
+
+    # The words of the verses with differences, in word order - tolist gives Python values sqlite3 can insert
+    verse_keys = ["book", "chapter", "verse"]
+    verses = mismatches[verse_keys].drop_duplicates()
+    verse_unicode_words = unicode_words.merge(verses, on=verse_keys).sort_values(reference)
+    verse_external_words = external_words.merge(verses, on=verse_keys).sort_values(reference)
+    unicode_rows = defaultdict(list)
+    for book, chapter, verse, total_word_index, word_index, word in zip(*(verse_unicode_words[column].tolist() for column in
+                                                                          verse_keys + ["total_word_index", "word_index", "unicode_word"])):
+        unicode_rows[(book, chapter, verse)].append((total_word_index, word_index, word))
+    external_rows = defaultdict(list)
+    for book, chapter, verse, word_index, word in zip(*(verse_external_words[column].tolist() for column in verse_keys + ["word_index", "external_word"])):
+        external_rows[(book, chapter, verse)].append((word_index, word))
+
+    book_orders = {book: book_order for book_order, book in enumerate(book_abbrevs)}
+    rows = []
+    for book, chapter, verse in sorted(unicode_rows.keys() | external_rows.keys(), key=lambda key: (book_orders[key[0]], key[1], key[2])):
+        rows += differing_verse_words(book, chapter, verse, unicode_rows[(book, chapter, verse)], external_rows[(book, chapter, verse)], nfc_forms)
+
+    code_points = [differing_code_points(nfc_forms.get(row[5]), nfc_forms.get(row[6])) for row in rows]
+
+    # An empty cell of the allow-list is a word only one of the texts has
+    allowlist = {(row[0], int(row[1]), int(row[2]), int(row[3]), row[4] or None, row[5] or None)
+                 for row in read_tool_csv(unicode_mismatch_allowlist_path()) if row}
+    cursor.executemany('''INSERT INTO unicode_mismatches (total_word_index, book, chapter, verse, word_index, unicode_word, external_word,
+                       unicode_code_points, external_code_points, allowed) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                       [row + points + (row[1:] in allowlist,) for row, points in zip(rows, code_points)])
+
+# Number of words of unicode_mismatches that aren't in the allow-list
+def unexpected_mismatches(cursor):
+    cursor.execute("SELECT COUNT(*) FROM unicode_mismatches WHERE NOT allowed")
+    return cursor.fetchone()[0]
+
+# The trait tables are read in name order so the csv is the same on every system
 def make_long_trait_codes():
-    new_dfs = []
-
-    csv_dir = (Path(__file__).parent / "tools" / "rp_code_trait_tables").resolve()
-    for csv_file in csv_dir.glob("*.csv"):
-        df = pd.read_csv(csv_file)
-        new_long_traits = df[df['Abbreviation'].astype(str).str.len() > 1].copy()
-
-        name = csv_file.stem
-
-        new_long_traits['origin_table'] = name
-
-        new_long_traits.columns = ['trait', 'code', 'origin_table']
-
-        new_dfs.append(new_long_traits)
-    
-    long_trait_codes = pd.concat(new_dfs, ignore_index=True)
-    long_trait_codes.to_csv((Path(__file__).parent / "tools" / "long_trait_codes.csv").resolve())
-
+    long_traits = []
+
+    csv_dir = TOOLS_DIR / "rp_code_trait_tables"
+    for csv_file in sorted(csv_dir.glob("*.csv")):
+        for trait, abbreviation in read_tool_csv(csv_file):
+            if len(abbreviation) > 1:
+                long_traits.append((trait, abbreviation, csv_file.stem))
+
+    with open(TOOLS_DIR / "long_trait_codes.csv", "w", encoding="utf-8", newline="") as file:
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(["", "trait", "code", "origin_table"])
+        writer.writerows((index,) + long_trait for index, long_trait in enumerate(long_traits))
+
+
+# rp_dict keys in the order of the trait columns of parse_codes
+RP_TRAIT_KEYS = ("gender", "alt_gender", "number", "word_case", "alt_word_case", "tense", "type", "voice", "mood", "alt_mood", "person",
+                 "indeclinable", "why_indeclinable", "kai_crasis", "attic_greek_form")
+
+# Returns the parsed words of one Strong's book as
+# (chapter, verse, word_index, word, unicode, str_num, code, alt_code, rp_pos, traits, is_proper_noun) rows
+def parse_strongs_book(file_path, transliterator, rp_decoder):
+    # [word, str_num, code, alt_code, chapter, verse, word_index] for every word of the book
+    entries = []
+    chapter = 1
+    verse = 1
+    word_index = 1
+    for token in lex_strongs_book(file_path):
+        if token.kind == VERSE_TOKEN:
+            if token.value != (chapter, verse):
+                word_index = 1
+            chapter, verse = token.value
+        elif token.kind == WORD_TOKEN:
+            entries.append([token.value, None, None, None, chapter, verse, word_index])
+            word_index += 1
+        elif token.kind == STRONGS_TOKEN:
+            entries[-1][1] = token.value
+        elif token.kind == CODE_TOKEN:
+            entries[-1][2] = token.value
+        elif token.kind == ALT_CODE_TOKEN:
+            entries[-1][3] = token.value
+
+    unicodes = transliterator.convert_many([entry[0] for entry in entries])
+
+    rows = []
+    for (word, str_num, code, alt_code, chapter, verse, word_index), unicode in zip(entries, unicodes):
+        decoding = rp_decoder.decode(code)
+        rp_pos = decoding["pos"]
+        rp_dict = decoding["dict"]
+
+        if alt_code is not None:
+            alt_decoding = rp_decoder.decode(alt_code)
+            alt_rp_pos = alt_decoding["pos"]
+            alt_rp_dict = alt_decoding["dict"]
+            if rp_pos != alt_rp_pos:
+                rp_pos += ", " + alt_rp_pos
+            for key in alt_rp_dict:
+                if key in rp_dict:
+                    if rp_dict[key] != alt_rp_dict[key]:
+                        rp_dict["alt_" + key] = alt_rp_dict[key]
+                else:
+                    rp_dict[key] = alt_rp_dict[key]
+
+        is_proper_noun = False
+        if rp_dict["why_indeclinable"] == "proper noun":
+            is_proper_noun = True
+
+        traits = tuple(rp_dict[key] for key in RP_TRAIT_KEYS)
+        rows.append((chapter, verse, word_index, word, unicode, str_num, code, alt_code, rp_pos, traits, is_proper_noun))
+    return rows
+
+# Drops a table, or the view an earlier schema had in its place
+def drop_table_or_view(cursor, name):
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = ? AND type IN ('table', 'view')", (name,))
+    row = cursor.fetchone()
+    if row is not None:
+        cursor.execute(f'DROP {row[0].upper()} {name}')
+
+# The columns of parse_codes after id, in the order of the trait columns of parsed_word_info
+PARSE_CODE_COLUMNS = ("rp_code", "rp_alt_code", "rp_pos") + tuple("rp_" + key for key in RP_TRAIT_KEYS)
+
+# parsed_words holds one row per parsed word and parse_codes one row per distinct (rp_code, rp_alt_code) pair with its
+# decoded traits - a few thousand pairs instead of the traits of every word
+# The parsed_word_info view joins them back into the columns parsed_word_info has always had
+# When only some books are rebuilt, parse_codes keeps its rows and the pairs new to those books are added after them
+def make_parsed_word_info(cursor, corpus, normalizers, jobs = 1, books = None):
+    # The parsed columns of the corpus are filled as the parsed words are written, or loaded again when only some
+    # books are rebuilt
+    corpus.load_words()
+    corpus.start_parsings()
+    if books is None:
+        drop_table_or_view(cursor, 'parsed_word_info')
+
+        cursor.execute('DROP TABLE IF EXISTS parse_codes')
+
+    clear_books(cursor, 'parsed_words', books, "book_id = ?", True)
 
-def make_parsed_word_info(cursor):
-    cursor.execute('DROP TABLE IF EXISTS parsed_word_info')
-    
     # pos means part of speech, number means singular, plural etc.
-    cursor.execute('''CREATE TABLE IF NOT EXISTS parsed_word_info (
-                   id INTEGER PRIMARY KEY AUTOINCREMENT,
-                   instance_id INTEGER,
-                   word VARCHAR(45),
-                   unicode VARCHAR(45),
-                   std_poly_form VARCHAR(45),
-                   std_poly_LC VARCHAR(45),
-                   str_num INTEGER,
+    cursor.execute('''CREATE TABLE IF NOT EXISTS parse_codes (
+                   id INTEGER PRIMARY KEY,
                    rp_code VARCHAR(45),
                    rp_alt_code VARCHAR(45),
                    rp_pos VARCHAR(45),
@@ -514,159 +1220,80 @@ def make_parsed_word_info(cursor):
                    rp_why_indeclinable VARCHAR(45),
                    rp_kai_crasis VARCHAR(45),
                    rp_attic_greek_form VARCHAR(45),
-                   FOREIGN KEY (instance_id) REFERENCES word_instances (id)
+                   UNIQUE (rp_code, rp_alt_code)
                    )'''
     )
 
-    base = (Path(__file__).parent / ".." / "external_sources" / "byzantine-majority-text-master" / "source" / "Strongs").resolve()
-    book_file_paths = [
-        base / "01_MAT.bp5",   # Matthew
-        base / "02_MAR.bp5",   # Mark
-        base / "03_LUK.bp5",   # Luke
-        base / "04_JOH.bp5",   # John
-        base / "05_ACT.bp5",   # Acts
-        base / "06_ROM.bp5",   # Romans
-        base / "07_1CO.bp5",   # 1 Corinthians
-        base / "08_2CO.bp5",   # 2 Corinthians
-        base / "09_GAL.bp5",   # Galatians
-        base / "10_EPH.bp5",   # Ephesians
-        base / "11_PHP.bp5",   # Philippians
-        base / "12_COL.bp5",   # Colossians
-        base / "13_1TH.bp5",   # 1 Thessalonians
-        base / "14_2TH.bp5",   # 2 Thessalonians
-        base / "15_1TI.bp5",   # 1 Timothy
-        base / "16_2TI.bp5",   # 2 Timothy
-        base / "17_TIT.bp5",   # Titus
-        base / "18_PHM.bp5",   # Philemon
-        base / "19_HEB.bp5",   # Hebrews
-        base / "20_JAM.bp5",   # James
-        base / "21_1PE.bp5",   # 1 Peter
-        base / "22_2PE.bp5",   # 2 Peter
-        base / "23_1JO.bp5",   # 1 John
-        base / "24_2JO.bp5",   # 2 John
-        base / "25_3JO.bp5",   # 3 John
-        base / "26_JUD.bp5",   # Jude
-        base / "27_REV.bp5"    # Revelation
-    ]
+    cursor.execute('''CREATE TABLE IF NOT EXISTS parsed_words (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   book_id INTEGER,
+                   instance_id INTEGER,
+                   word VARCHAR(45),
+                   unicode VARCHAR(45),
+                   std_poly_form VARCHAR(45),
+                   std_poly_LC VARCHAR(45),
+                   str_num INTEGER,
+                   parse_code_id INTEGER,
+                   FOREIGN KEY (instance_id) REFERENCES word_instances (id),
+                   FOREIGN KEY (parse_code_id) REFERENCES parse_codes (id)
+                   )'''
+    )
 
-    # Skips row 20 because that contains ς which only occurs at the end of words - the program adds it later
-    alpha_df = pd.read_csv((Path(__file__).parent / "tools" / "betacode_translation" / "betacode_alphabet.csv").resolve(), usecols=[2, 3], skiprows=[20], nrows=26)
-    alpha_df.columns = ['letter', 'betacode']
-    alphabet_map = dict(zip(alpha_df["betacode"], alpha_df["letter"]))
-
-    df = pd.read_csv((Path(__file__).parent / "tools" / "betacode_translation" / "betacode_diacritics.csv").resolve(), usecols=[0, 2])
-    # Ignores last row which contains the coding for the breve, which is not in the ancient text
-    df = df[:-1]
-    df.columns = ['diacritic', 'name']
-    diacritic_map =  dict(zip(df["name"], df['diacritic']))
-    diacritic_list = df['diacritic'].tolist()
-
-    info_df = pd.read_csv((Path(__file__).parent / "tools" / "rp_code_info.csv").resolve())
-    long_trait_df = pd.read_csv((Path(__file__).parent / "tools" / "long_trait_codes.csv").resolve())
-
-    # Making a df for every rp code trait table
-    trait_table_path = (Path(__file__).parent / "tools" / "rp_code_trait_tables").resolve()
-    trait_table_files = [file for file in os.listdir(trait_table_path) if file.endswith('.csv')]
-    trait_table_dfs = {}
-    for file in trait_table_files:
-        file_path = os.path.join(trait_table_path, file)
-        file_name = os.path.splitext(file)[0]
-        trait_table_dfs[file_name] = pd.read_csv(file_path, dtype=str)
-
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_word_instances ON word_instances(book, chapter, verse, word_index)")
-
-    book_counter = 0
-    for file_path in book_file_paths:
-        with open(file_path, "r", encoding="utf-8") as file:
-            contents = file.read()
-            # Split by any whitespace (spaces, tabs, newlines)
-            words = re.split(r'\s+', contents)
-            # Remove any empty strings
-            words = [w for w in words if w]
-
-            book = book_abbrevs[book_counter]
-            chapter = 1
-            verse = 1
-            word_index = 1
+    cursor.execute(f'''CREATE VIEW IF NOT EXISTS parsed_word_info AS
+                   SELECT pw.id, pw.instance_id, pw.word, pw.unicode, pw.std_poly_form, pw.std_poly_LC, pw.str_num,
+                          {", ".join("pc." + column for column in PARSE_CODE_COLUMNS)}
+                   FROM parsed_words pw
+                   JOIN parse_codes pc ON pw.parse_code_id = pc.id'''
+    )
 
-            i = 2
-            while i < len(words):
-                word = words[i-2]
-                # chapter and verse is now in form Chapter.Verse
-                if len(word) == 5 and (word.replace(".", "")).isdigit() and word[2] == ".":
-                    i += 1
-                    last_chapter = chapter
-                    last_verse = verse
-                    chapter = int(word[:2])
-                    verse = int(word[3:])
-                    if chapter != last_chapter or verse != last_verse:
-                        word_index = 1
-                else:
-                    unicode = betacode_to_unicode(word, alphabet_map)
-
-                    try:
-                        str_num = int(words[i - 1])
-                    except ValueError:
-                        str_num = -1
-
-                    code = words[i]
-                    alt_code = None
-                    decoding = decode_rp_code(code, info_df, long_trait_df, trait_table_dfs)
-                    rp_pos = decoding["pos"]
-                    rp_dict = decoding["dict"]
-
-                    two_codes = False
-                    # Check if there's a "γη 1093 {N-NSF} 1093 {N-VSF}" situation
-                    if i + 2 < len(words) and "{" in words[i + 2]:
-                        two_codes = True
-                        alt_code = words[i+2]
-                        alt_decoding = decode_rp_code(alt_code, info_df, long_trait_df, trait_table_dfs)
-                        alt_rp_pos = alt_decoding["pos"]
-                        alt_rp_dict = alt_decoding["dict"]
-                        if rp_pos != alt_rp_pos:
-                            rp_pos += ", " + alt_rp_pos
-                        for key in alt_rp_dict:
-                            if key in rp_dict:
-                                if rp_dict[key] != alt_rp_dict[key]:
-                                    rp_dict["alt_" + key] = alt_rp_dict[key]
-                            else:
-                                rp_dict[key] = alt_rp_dict[key]
-                    
-                    is_proper_noun = False
-                    if rp_dict["why_indeclinable"] == "proper noun":
-                        is_proper_noun = True
-                    instance_id = None
-                    std_poly_form = None
-                    std_poly_LC = None
-
-                    cursor.execute("SELECT id, unicode FROM word_instances WHERE book = ? AND chapter = ? AND verse = ? AND word_index = ?", (book, chapter, verse, word_index))
-                    instance_row = cursor.fetchone()
-                    if instance_row:
-                        instance_id = instance_row[0]
-                        std_poly_form = to_std_poly_form(instance_row[1], is_proper_noun, diacritic_map)
-                        std_poly_LC = std_poly_form.lower()
-                        test_poly = simplify_unicode(std_poly_LC, diacritic_list)
-                        if unicode != test_poly:
-                            std_poly_LC = "!!!"
-
-                    cursor.execute('''
-                                    INSERT INTO parsed_word_info (instance_id, word, unicode, std_poly_form, std_poly_LC, str_num, rp_code, rp_alt_code, rp_pos, rp_gender, rp_alt_gender, rp_number,
-                                   rp_word_case, rp_alt_word_case, rp_tense, rp_type, rp_voice, rp_mood, rp_alt_mood, rp_person, rp_indeclinable, rp_why_indeclinable, rp_kai_crasis,
-                                   rp_attic_greek_form) 
-                                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) 
-                                    ''',
-                                    (instance_id, word, unicode, std_poly_form, std_poly_LC, str_num, code, alt_code, rp_pos, rp_dict["gender"], rp_dict["alt_gender"], rp_dict["number"], rp_dict["word_case"],
-                                     rp_dict["alt_word_case"], rp_dict["tense"], rp_dict["type"], rp_dict["voice"], rp_dict["mood"], rp_dict["alt_mood"], rp_dict["person"],
-                                     rp_dict["indeclinable"], rp_dict["why_indeclinable"], rp_dict["kai_crasis"], rp_dict["attic_greek_form"])
-                                )
-                    
-                    word_index += 1
-
-                    if two_codes:
-                        i += 2
-
-                    i += 3
-        book_counter += 1
+
+    alphabet_map = betacode_lowercase_map()
+    diacritics = betacode_diacritics()
+    diacritic_map = {name: diacritic for diacritic, _, name in diacritics}
+    diacritic_list = [diacritic for diacritic, _, _ in diacritics]
+
+    rp_decoder = make_rp_decoder()
+    transliterator = BetacodeTransliterator(alphabet_map)
+
+    normalizer = normalizers.get(diacritic_list, diacritic_map["Grave accent"], diacritic_map["Acute accent"])
+
+    writer = BulkWriter(cursor)
+    # (code, alt_code) -> parse_codes id, in the order the pairs first appear
+    cursor.execute("SELECT rp_code, rp_alt_code, id FROM parse_codes ORDER BY id")
+    parse_code_ids = {(code, alt_code): parse_code_id for code, alt_code, parse_code_id in cursor.fetchall()}
+    parse_code_sql = f"INSERT INTO parse_codes (id, {', '.join(PARSE_CODE_COLUMNS)}) VALUES ({', '.join('?' * (len(PARSE_CODE_COLUMNS) + 1))})"
+    parse_book = partial(parse_strongs_book, transliterator=transliterator, rp_decoder=rp_decoder)
+    for (book_id, _), rows in zip(selected_books(books), map_books(parse_book, selected_paths(strongs_book_paths(), books), jobs)):
+        # Every word of the book keyed by its reference, so parsed words are matched to instances without a query per word
+        positions = {(corpus.chapters[position], corpus.verses[position], corpus.word_indexes[position]): position
+                     for position in corpus.book_positions(book_id)}
+        for chapter, verse, word_index, word, unicode, str_num, code, alt_code, rp_pos, traits, is_proper_noun in rows:
+            instance_id = None
+            std_poly_form = None
+            std_poly_LC = None
+
+            position = positions.get((chapter, verse, word_index))
+            if position is not None:
+                instance_id = position + 1
+                std_poly_form = normalizer.std_poly(corpus.forms[corpus.unicode_ids[position]], is_proper_noun)
+                std_poly_LC = std_poly_form.lower()
+                test_poly = normalizer.unaccented(std_poly_LC)
+                if unicode != test_poly:
+                    std_poly_LC = "!!!"
+                corpus.set_parsing(position, str_num, unicode)
+
+            parse_code_id = parse_code_ids.get((code, alt_code))
+            if parse_code_id is None:
+                parse_code_id = len(parse_code_ids) + 1
+                parse_code_ids[(code, alt_code)] = parse_code_id
+                writer.execute(parse_code_sql, (parse_code_id, code, alt_code, rp_pos) + traits)
+
+            writer.execute('''INSERT INTO parsed_words (book_id, instance_id, word, unicode, std_poly_form, std_poly_LC, str_num, parse_code_id)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                           (book_id, instance_id, word, unicode, std_poly_form, std_poly_LC, str_num, parse_code_id))
+
+    writer.flush()
+    corpus.has_parsings = books is None
 
 
 def make_std_poly_info(cursor):
@@ -681,38 +1308,39 @@ def make_std_poly_info(cursor):
                    str_num_3 INTEGER
                    )''')
 
-    cursor.execute("SELECT DISTINCT std_poly_form, str_num FROM parsed_word_info")
+    # In book order, since the parsed words of a book rebuilt on its own are added after the other books'
+    cursor.execute("SELECT std_poly_form, str_num FROM parsed_words ORDER BY book_id, id")
+
+    rows = list(dict.fromkeys(cursor.fetchall()))
+
+    writer = BulkWriter(cursor)
+    # Groups the Strong's numbers of every std_poly_form in one pass, 3 at a time and in the order the rows were read
+    # A form with more than 3 numbers gets a second group, whose INSERT hits the conflict below and sets str_num_3 to "!!!"
+    groups = []
+    open_groups = {}
+    for std_poly_form, str_num in rows:
+        str_nums = open_groups.get(std_poly_form)
+        if str_nums is None or len(str_nums) == 3:
+            str_nums = [str_num]
+            open_groups[std_poly_form] = str_nums
+            groups.append((std_poly_form, str_nums))
+        else:
+            str_nums.append(str_num)
 
-    rows = cursor.fetchall()
+    for std_poly_form, str_nums in groups:
+        std_poly_LC = std_poly_form.lower()
 
-    used_indexes = []
-    for i in range(len(rows)):
-        if i in used_indexes:
-            continue
-        std_poly_form = rows[i][0]
-        std_poly_LC = rows[i][0].lower()
-        str_nums = []
-        str_nums.append(rows[i][1])
-        
-        for j in range(i, len(rows)):
-            if len(str_nums) > 3:
-                raise ValueError(f"ERROR IN make_std_poly_info: 3 str_nums for one std_poly_form - {std_poly_form}: {str_nums}")
-            if len(str_nums) == 3:
-                break
-            if j in used_indexes:
-                continue
-            if rows[j][0] == std_poly_form and rows[j][1] not in str_nums:
-                str_nums.append(rows[j][1])
-                used_indexes.append(j)
-        
         while len(str_nums) < 3:
             str_nums.append(None)
-        cursor.execute('''INSERT INTO std_poly_info (std_poly_form, std_poly_LC, str_num_1, str_num_2, str_num_3) VALUES (?, ?, ?, ?, ?)
+        writer.execute('''INSERT INTO std_poly_info (std_poly_form, std_poly_LC, str_num_1, str_num_2, str_num_3) VALUES (?, ?, ?, ?, ?)
                        ON CONFLICT (std_poly_form) DO UPDATE SET str_num_3 = "!!!"''',
                        (std_poly_form, std_poly_LC, str_nums[0], str_nums[1], str_nums[2])
         )
 
+    writer.flush()
+
 
+# The definitions are cut out of the glosses with one regular expression over the whole column
 def make_strongs_info(cursor):
     cursor.execute('DROP TABLE IF EXISTS strongs_info')
 
@@ -726,26 +1354,49 @@ def make_strongs_info(cursor):
                    root_3 VARCHAR(45)
                    )''')
     
-    df = pd.read_csv((Path(__file__).parent / ".." / "external_sources" / "Greek Strongs from Matthias Mueller 20250623.csv").resolve(),
+    import pandas as pd
+
+    df = pd.read_csv(strongs_definitions_path(),
                      usecols=[1, 2, 3, 11, 13, 15])
     df.columns = ['str_num', 'word', 'gloss', 'root_1', 'root_2', 'root_3']
-    to_insert = []
-    for _, row in df.iterrows():
-        if row['word'] == "not used":
-            continue
-        try:
-
-            definition = str(row['gloss']).split("KJV: ")[1]
-            definition = re.split(r"See also:|Compare:|Root\(s\):", definition)[0].strip()
-            definition.replace("+", "")
-        except IndexError:
-            definition = None
-        to_insert.append((row['word'], row['str_num'], definition, row["root_1"], row['root_2'], row['root_3']))
-    cursor.executemany('INSERT INTO strongs_info (word, str_num, def, root_1, root_2, root_3) VALUES (?, ?, ?, ?, ?, ?)', (to_insert))
-
-
-def make_source_verses(cursor):
-    cursor.execute('DROP TABLE IF EXISTS source_verses')
+    df = df[df['word'] != "not used"]
+
+    # The definition is the text after the first "KJV: ", up to the next "KJV: " or the first See also, Compare or Root(s) -
+    # None if the gloss has no "KJV: "
+    df = df.assign(definition=df['gloss'].astype(str).str.extract(r"KJV: (.*?)(?=KJV: |See also:|Compare:|Root\(s\):|\Z)", flags=re.DOTALL)[0].str.strip())
+
+    # Missing values are inserted as NULL
+    rows = df[['word', 'str_num', 'definition', 'root_1', 'root_2', 'root_3']].astype(object)
+    rows = rows.where(rows.notna(), None)
+    cursor.executemany('INSERT INTO strongs_info (word, str_num, def, root_1, root_2, root_3) VALUES (?, ?, ?, ?, ?, ?)',
+                       rows.itertuples(index=False, name=None))
+
+
+# Writes a row per verse of word_instances to a verses table, whose verse_text is the word_text of its words in word order
+# A verse is every word with the same book, chapter and verse, so chapters that end and start on the same verse number
+# and one-verse books each get their own row
+# group_concat(... ORDER BY ...) needs SQLite 3.44, so the words are joined by a window ordered by total_word_index
+# instead (windows need 3.25 - see MIN_SQLITE_VERSION) - the verses are inserted in the order of their first words
+def insert_verses(cursor, table, word_text, joins, books):
+    condition = "1"
+    if books is not None:
+        condition = f"wi.book IN ({', '.join('?' * len(books))})"
+    cursor.execute(f'''INSERT INTO {table} (book, chapter, verse_num, verse_text)
+                   SELECT book, chapter, verse, verse_text FROM (
+                       SELECT wi.book, wi.chapter, wi.verse, wi.total_word_index,
+                              group_concat({word_text}, ' ') OVER verse_words AS verse_text,
+                              row_number() OVER verse_words AS word_number
+                       FROM word_instances wi
+                       {joins}
+                       WHERE {condition}
+                       WINDOW verse_words AS (PARTITION BY wi.book, wi.chapter, wi.verse ORDER BY wi.total_word_index
+                                              ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+                   )
+                   WHERE word_number = 1
+                   ORDER BY total_word_index''', tuple(books or ()))
+
+def make_source_verses(cursor, books = None):
+    clear_books(cursor, 'source_verses', books)
 
     cursor.execute('''CREATE TABLE IF NOT EXISTS source_verses (
                    id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -755,25 +1406,11 @@ def make_source_verses(cursor):
                    verse_text TEXT
     )''')
 
-    cursor.execute('''SELECT unicode, book, chapter, verse FROM word_instances inst''')
-
-    rows = cursor.fetchall()
-
-    verse_text = ""
-    for i in range(len(rows)):
-        word = rows[i][0]
-        book = rows[i][1]
-        chapter = rows[i][2]
-        verse_num = int(rows[i][3])
-        verse_text += word + " "
-        if i == len(rows) - 1 or int(rows[i+1][3]) != verse_num:
-            verse_text = verse_text.strip()
-            cursor.execute("INSERT INTO source_verses (book, chapter, verse_num, verse_text) VALUES (?, ?, ?, ?)", (book, chapter, verse_num, verse_text))
-            verse_text = ""
+    insert_verses(cursor, 'source_verses', "wi.unicode", "", books)
 
 # To match by strong's number
-def make_str_num_verses(cursor):
-    cursor.execute('DROP TABLE IF EXISTS str_num_verses')
+def make_str_num_verses(cursor, books = None):
+    clear_books(cursor, 'str_num_verses', books)
 
     cursor.execute('''CREATE TABLE IF NOT EXISTS str_num_verses (
                    id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -783,27 +1420,33 @@ def make_str_num_verses(cursor):
                    verse_text TEXT
     )''')
 
-    cursor.execute('''SELECT pinf.str_num, inst.unicode, inst.book, inst.chapter, inst.verse FROM word_instances inst LEFT JOIN parsed_word_info pinf ON inst.id = pinf.instance_id''')
-    # cursor.execute('''SELECT pinf.str_num, inst.unicode, inst.book, inst.chapter, inst.verse FROM word_instances inst
-    #                LEFT JOIN parsed_word_info pinf ON inst.id = pinf.instance_id
-    #                LIMIT 15''')
-    rows = cursor.fetchall()
-
-    verse_text = ""
-    for i in range(len(rows)):
-        str_num = str(rows[i][0])
-        book = rows[i][2]
-        chapter = rows[i][3]
-        verse_num = int(rows[i][4])
-        verse_text += str_num + " "
-        if i == len(rows) - 1 or int(rows[i+1][4]) != verse_num:
-            verse_text = verse_text.strip()
-            cursor.execute("INSERT INTO str_num_verses (book, chapter, verse_num, verse_text) VALUES (?, ?, ?, ?)", (book, chapter, verse_num, verse_text))
-            verse_text = ""
-
-
-def make_sbl_words(cursor):
-    cursor.execute('DROP TABLE IF EXISTS sbl_words')
+    # Words without a parsed_words row show as None
+    insert_verses(cursor, 'str_num_verses', "COALESCE(CAST(pw.str_num AS TEXT), 'None')",
+                  "LEFT JOIN parsed_words pw ON pw.instance_id = wi.id", books)
+
+
+# Returns the words of one SBLGNT book as they are in the text, as (word, chapter, verse, word_index) rows
+def read_sbl_book(file_path):
+    rows = []
+    for token in lex_sbl_book(file_path):
+        if token.kind == VERSE_TOKEN:
+            chapter, verse = token.value
+            word_index = 1
+            continue
+
+        rows.append((token.value, chapter, verse, word_index))
+        word_index += 1
+    return rows
+
+def make_sbl_words(cursor, normalizers, jobs = 1, books = None):
+    # (first total_word_index, words) of every rebuilt book, read before its rows are deleted
+    book_words = {}
+    if books is not None:
+        for _, book in selected_books(books):
+            cursor.execute("SELECT MIN(total_word_index), COUNT(*) FROM sbl_words WHERE book = ?", (book,))
+            book_words[book] = cursor.fetchone()
+
+    clear_books(cursor, 'sbl_words', books)
     
     cursor.execute('''CREATE TABLE IF NOT EXISTS sbl_words (
                    id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -817,87 +1460,151 @@ def make_sbl_words(cursor):
                    total_word_index INTEGER
                    )''')
     
-    base = (Path(__file__).parent / ".." / "external_sources" / "SBLGNT-master" / "data" / "sblgnt" / "text").resolve()
-    book_file_paths = [
-        base / "Matt.txt",
-        base / "Mark.txt",
-        base / "Luke.txt",
-        base / "John.txt",
-        base / "Acts.txt",
-        base / "Rom.txt",
-        base / "1Cor.txt",
-        base / "2Cor.txt",
-        base / "Gal.txt",
-        base / "Eph.txt",
-        base / "Phil.txt",
-        base / "Col.txt",
-        base / "1Thess.txt",
-        base / "2Thess.txt",
-        base / "1Tim.txt",
-        base / "2Tim.txt",
-        base / "Titus.txt",
-        base / "Phlm.txt",
-        base / "Heb.txt",
-        base / "Jas.txt",
-        base / "1Pet.txt",
-        base / "2Pet.txt",
-        base / "1John.txt",
-        base / "2John.txt",
-        base / "3John.txt",
-        base / "Jude.txt",
-        base / "Rev.txt"
-    ]
 
-    char_df = pd.read_csv((Path(__file__).parent / "tools" / "SBLGNT" / "characters.csv").resolve(), usecols=[1, 2, 3, 4])
-    char_df.columns = ['diacritics', 'diacritic_names', 'punctuation', 'footnote']
-    punc_chars = set(char_df['punctuation'])
-    foot_chars = set(char_df['footnote'])
-    diac_chars = set(char_df["diacritics"])
-    name_diacritic_map =  dict(zip(char_df["diacritic_names"], char_df['diacritics']))
+    diac_chars, punc_chars, foot_chars, name_diacritic_map = sbl_characters()
+    normalizer = normalizers.get(diac_chars, name_diacritic_map["Grave accent"], name_diacritic_map["Acute accent"], punc_chars | foot_chars)
 
-    book_counter = 0
+    writer = BulkWriter(cursor)
     total_word_index = 1
-    for file_path in book_file_paths:
-        with open(file_path, "r", encoding="utf-8") as file:
-            contents = file.read()
-            # Split by any whitespace (spaces, tabs, newlines)
-            words = re.split(r'\s+', contents)
-            # Remove any empty strings
-            words = [w for w in words if w]
-            book = book_abbrevs[book_counter]
-            chapter = None
-            verse = None
-            word_index = None
-            for word in words:
-                book_name = str(file_path.relative_to(base)).split('.')[0]
-                if word == book_name:
-                    continue
-                if ':' in word and (word.replace(":", "")).isdigit():
-                    chapter_verse = word.split(':')
-                    chapter = int(chapter_verse[0])
-                    verse = int(chapter_verse[1])
-                    word_index = 1
-                    continue
-                if chapter is None or verse is None or word_index is None:
-                    continue
-
-                word = ''.join(c for c in word if c not in punc_chars and c not in foot_chars and not c.isdigit())
-                lower_word = word.lower()
-                lower_word = unicodedata.normalize('NFD', lower_word)
-                mono_LC = ''.join(c for c in lower_word if c not in diac_chars)
-                mono_LC = unicodedata.normalize('NFC', mono_LC)
-                std_poly_LC = to_std_poly_form(word, False, name_diacritic_map)
-                
-                cursor.execute("INSERT INTO sbl_words (word, mono_LC, std_poly_LC, book, chapter, verse, word_index, total_word_index) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                    (word, mono_LC, std_poly_LC, book, chapter, verse, word_index, total_word_index)
-                )
-                word_index += 1
-                total_word_index += 1
-        book_counter += 1
-
-
-def make_word_orders(cursor):
-    cursor.execute('DROP TABLE IF EXISTS instance_word_order')
+    for (_, book), rows in zip(selected_books(books), map_books(read_sbl_book, selected_paths(sbl_book_paths(), books), jobs)):
+        if books is not None:
+            total_word_index, words = book_words[book]
+            check_book_words("make_sbl_words", book, len(rows), words)
+
+        # The id of every word is its total_word_index
+        for source_word, chapter, verse, word_index in rows:
+            word = normalizer.clean(source_word)
+            mono_LC = normalizer.mono_LC(word)
+            std_poly_LC = normalizer.std_poly(word, False)
+            writer.execute("INSERT INTO sbl_words (id, word, mono_LC, std_poly_LC, book, chapter, verse, word_index, total_word_index) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (total_word_index, word, mono_LC, std_poly_LC, book, chapter, verse, word_index, total_word_index)
+            )
+            total_word_index += 1
+
+    writer.flush()
+
+
+# Aligns the Strong's numbers of a verse's RP words against the candidate Strong's numbers (str_num_1..3) of its SBL words,
+# keeping the longest common subsequence of words where the RP number is one of the SBL candidates
+# Returns (rp_orders, sbl_orders, matched) - the word orders are parallel to the inputs, a matched pair shares a
+# word order, and the words only in one edition get their own, RP words before SBL words in between matches
+def align_verse(rp_nums, sbl_num_sets):
+    rp_count = len(rp_nums)
+    sbl_count = len(sbl_num_sets)
+
+    # matches at the start and end of the verse don't need the full table
+    start = 0
+    while start < rp_count and start < sbl_count and rp_nums[start] in sbl_num_sets[start]:
+        start += 1
+    rp_end = rp_count
+    sbl_end = sbl_count
+    while rp_end > start and sbl_end > start and rp_nums[rp_end - 1] in sbl_num_sets[sbl_end - 1]:
+        rp_end -= 1
+        sbl_end -= 1
+
+    # lengths[i][j] is the length of the longest common subsequence of rp_middle[i:] and sbl_middle[j:]
+    rp_middle = rp_nums[start:rp_end]
+    sbl_middle = sbl_num_sets[start:sbl_end]
+    lengths = [[0] * (len(sbl_middle) + 1) for _ in range(len(rp_middle) + 1)]
+    for i in range(len(rp_middle) - 1, -1, -1):
+        row = lengths[i]
+        next_row = lengths[i + 1]
+        rp_num = rp_middle[i]
+        for j in range(len(sbl_middle) - 1, -1, -1):
+            if rp_num in sbl_middle[j]:
+                row[j] = next_row[j + 1] + 1
+            else:
+                row[j] = max(next_row[j], row[j + 1])
+
+    pairs = [(i, i) for i in range(start)]
+    i = 0
+    j = 0
+    while i < len(rp_middle) and j < len(sbl_middle):
+        if rp_middle[i] in sbl_middle[j]:
+            pairs.append((start + i, start + j))
+            i += 1
+            j += 1
+        elif lengths[i + 1][j] >= lengths[i][j + 1]:
+            i += 1
+        else:
+            j += 1
+    pairs.extend((rp_end + k, sbl_end + k) for k in range(rp_count - rp_end))
+
+    rp_orders = [0] * rp_count
+    sbl_orders = [0] * sbl_count
+    curr_order = 1
+    rp_counter = 0
+    sbl_counter = 0
+    for rp_match, sbl_match in pairs + [(rp_count, sbl_count)]:
+        while rp_counter < rp_match:
+            rp_orders[rp_counter] = curr_order
+            curr_order += 1
+            rp_counter += 1
+        while sbl_counter < sbl_match:
+            sbl_orders[sbl_counter] = curr_order
+            curr_order += 1
+            sbl_counter += 1
+        if rp_match < rp_count:
+            rp_orders[rp_counter] = curr_order
+            sbl_orders[sbl_counter] = curr_order
+            curr_order += 1
+            rp_counter += 1
+            sbl_counter += 1
+
+    return rp_orders, sbl_orders, len(pairs)
+
+# The Strong's numbers an SBL word can be matched on - missing numbers and the "!!!" of std_poly_info never match
+def sbl_candidates(str_nums):
+    return frozenset(str_num for str_num in str_nums if str_num is not None and str_num != "!!!")
+
+# Aligns one verse (either edition may be empty) and writes its word orders, its aligned rows and its alignment score
+# rp_rows are (instance_id, str_num) and sbl_rows are (sbl_id, str_num_1, str_num_2, str_num_3), in word_index order
+def write_verse_alignment(writer, book_id, book, chapter, verse, rp_rows, sbl_rows):
+    rp_nums = [rp_row[1] for rp_row in rp_rows]
+    sbl_num_sets = [sbl_candidates(sbl_row[1:]) for sbl_row in sbl_rows]
+    rp_orders, sbl_orders, matched = align_verse(rp_nums, sbl_num_sets)
+
+    # [instance_id, sbl_id] for every word order of the verse
+    aligned = [[None, None] for _ in range(len(rp_rows) + len(sbl_rows) - matched)]
+    for rp_row, rp_order in zip(rp_rows, rp_orders):
+        writer.execute("INSERT INTO instance_word_order (instance_id, word_order) VALUES (?, ?)", (rp_row[0], rp_order))
+        aligned[rp_order - 1][0] = rp_row[0]
+    for sbl_row, sbl_order in zip(sbl_rows, sbl_orders):
+        writer.execute("INSERT INTO sbl_word_order (sbl_id, word_order) VALUES (?, ?)", (sbl_row[0], sbl_order))
+        aligned[sbl_order - 1][1] = sbl_row[0]
+    for word_order, (instance_id, sbl_id) in enumerate(aligned, 1):
+        writer.execute('''INSERT INTO aligned_rows (book_id, chapter, verse, word_order, instance_id, sbl_id)
+                       VALUES (?, ?, ?, ?, ?, ?)''', (book_id, chapter, verse, word_order, instance_id, sbl_id))
+
+    # Dice coefficient of the two editions - 1 when every word is matched, 0 for a verse in only one edition
+    score = 2 * matched / (len(rp_rows) + len(sbl_rows))
+    writer.execute('''INSERT INTO verse_alignment_scores (book, chapter, verse, rp_words, sbl_words, matched_words, score)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)''', (book, chapter, verse, len(rp_rows), len(sbl_rows), matched, score))
+
+# Yields ((chapter, verse), rows) for every verse of a book in the corpus, with (instance_id, str_num) rows in word_index order
+def corpus_book_verses(corpus, book_id):
+    positions = sorted(corpus.book_positions(book_id),
+                       key=lambda position: (corpus.chapters[position], corpus.verses[position], corpus.word_indexes[position]))
+    for chapter_verse, verse_positions in groupby(positions, key=lambda position: (corpus.chapters[position], corpus.verses[position])):
+        yield chapter_verse, [(position + 1, corpus.str_num(position)) for position in verse_positions]
+
+# Yields ((chapter, verse), rows) for every verse of a book, streamed from an ordered scan of the book
+# The query takes the book and selects chapter, verse and then the columns of the rows
+def book_verses(cursor, query, book):
+    cursor.execute(query, (book,))
+    rows = chain.from_iterable(iter(lambda: cursor.fetchmany(BULK_BATCH_SIZE), []))
+    for chapter_verse, verse_rows in groupby(rows, key=itemgetter(0, 1)):
+        yield chapter_verse, [row[2:] for row in verse_rows]
+
+SBL_VERSE_QUERY = '''SELECT sbl.chapter, sbl.verse, sbl.id, spinf.str_num_1, spinf.str_num_2, spinf.str_num_3 FROM sbl_words sbl
+                   LEFT JOIN std_poly_info spinf ON sbl.std_poly_LC = spinf.std_poly_LC
+                   WHERE sbl.book = ?
+                   ORDER BY sbl.chapter, sbl.verse, sbl.word_index'''
+
+def make_word_orders(cursor, corpus, books = None):
+    corpus.load_parsings()
+
+    clear_books(cursor, 'instance_word_order', books, "instance_id IN (SELECT id FROM word_instances WHERE book = ?)")
 
     cursor.execute('''CREATE TABLE IF NOT EXISTS instance_word_order (
                    id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -905,8 +1612,8 @@ def make_word_orders(cursor):
                    word_order INTEGER,
                    FOREIGN KEY (instance_id) REFERENCES word_instances(id)
                    )''')
-    
-    cursor.execute('DROP TABLE IF EXISTS sbl_word_order')
+
+    clear_books(cursor, 'sbl_word_order', books, "sbl_id IN (SELECT id FROM sbl_words WHERE book = ?)")
 
     cursor.execute('''CREATE TABLE IF NOT EXISTS sbl_word_order (
                    id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -915,212 +1622,65 @@ def make_word_orders(cursor):
                    FOREIGN KEY (sbl_id) REFERENCES sbl_words(id)
                    )''')
 
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sbl_words_bcv ON sbl_words(book, chapter, verse)")
-
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_word_instances_id ON word_instances(id)")
-
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_parsed_word_info_instance_id ON parsed_word_info(instance_id)")
-
-
-    cursor.execute("SELECT DISTINCT book, chapter, verse FROM word_instances ORDER BY book, chapter, verse")
-    rp_bcv_rows = cursor.fetchall()
-
-    cursor.execute("SELECT DISTINCT book, chapter, verse FROM sbl_words ORDER BY book, chapter, verse")
-    sbl_bcv_rows = cursor.fetchall()
-
-
-    book_index = 0
-    chapter_index = 1
-    verse_index = 2
-    rp_bcv_counter = 0
-    sbl_bcv_counter = 0
-    rp_turn = True
-    rp_bcv_done = False
-    sbl_bcv_done = False
-    if not rp_bcv_rows or not sbl_bcv_rows:
-        rp_bcv_done = True
-        sbl_bcv_done = True
-    while not rp_bcv_done or not sbl_bcv_done:
-        rp_bcv_row = rp_bcv_rows[rp_bcv_counter]
-        sbl_bcv_row = sbl_bcv_rows[sbl_bcv_counter]
-        
-        id_index = 0
-        str_num_index = 5
-        word_index_index = 4
-        if rp_bcv_row != sbl_bcv_row:
-            if rp_bcv_row[book_index] == sbl_bcv_row[book_index]:
-                if rp_bcv_row[chapter_index] == sbl_bcv_row[chapter_index]:
-                    if rp_bcv_row[verse_index] > sbl_bcv_row[verse_index]:
-                        rp_turn = False
-                    elif rp_bcv_row[verse_index] < sbl_bcv_row[verse_index]:
-                        rp_turn = True
-                elif rp_bcv_row[chapter_index] > sbl_bcv_row[chapter_index]:
-                    rp_turn = False
-                else:
-                    rp_turn = True
-            elif rp_bcv_row[book_index] > sbl_bcv_row[book_index]:
-                rp_turn = False
-            else:
-                rp_turn = True
-
-            if rp_turn:
-
-                cursor.execute('''WITH winst AS (
-                            SELECT id, book, chapter, verse, word_index FROM word_instances WHERE book = ? AND chapter = ? AND verse = ?
-                           )
-                           SELECT winst.id, winst.book, winst.chapter, winst.verse, winst.word_index, pinf.str_num FROM winst
-                           LEFT JOIN parsed_word_info pinf ON winst.id = pinf.instance_id
-                           ''',
-                        (rp_bcv_row[book_index], rp_bcv_row[chapter_index], rp_bcv_row[verse_index]))
-                rp_rows = cursor.fetchall()
-                for rp_row in rp_rows:
-                    cursor.execute("INSERT INTO instance_word_order (instance_id, word_order) VALUES (?, ?)", (rp_row[id_index], rp_row[word_index_index]))
-                rp_bcv_counter += 1
-                rp_turn = False
+    clear_books(cursor, 'verse_alignment_scores', books)
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS verse_alignment_scores (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   book VARCHAR(45),
+                   chapter INTEGER,
+                   verse INTEGER,
+                   rp_words INTEGER,
+                   sbl_words INTEGER,
+                   matched_words INTEGER,
+                   score REAL
+                   )''')
+
+    # One row per line of word_classification.csv, in output order - instance_id or sbl_id is null for a word
+    # only in one edition, and book_id is the id of the book in books
+    clear_books(cursor, 'aligned_rows', books, "book_id = ?", True)
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS aligned_rows (
+                   book_id INTEGER,
+                   chapter INTEGER,
+                   verse INTEGER,
+                   word_order INTEGER,
+                   instance_id INTEGER,
+                   sbl_id INTEGER,
+                   PRIMARY KEY (book_id, chapter, verse, word_order),
+                   FOREIGN KEY (instance_id) REFERENCES word_instances(id),
+                   FOREIGN KEY (sbl_id) REFERENCES sbl_words(id)
+                   ) WITHOUT ROWID''')
+
+    drop_redundant_indexes(cursor)
+
+    cursor.execute(SBL_WORDS_VERSE_INDEX)
+
+    cursor.execute(PARSED_WORDS_PARSING_INDEX)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_std_poly_info_LC ON std_poly_info(std_poly_LC)")
+
+    # Merges the verses of both editions a book at a time, in canonical book order - a verse in only one edition
+    # is aligned against an empty verse
+    writer = BulkWriter(cursor)
+    sbl_cursor = cursor.connection.cursor()
+    for book_id, book in selected_books(books):
+        rp_verses = corpus_book_verses(corpus, book_id)
+        sbl_verses = book_verses(sbl_cursor, SBL_VERSE_QUERY, book)
+        rp_verse = next(rp_verses, None)
+        sbl_verse = next(sbl_verses, None)
+        while rp_verse is not None or sbl_verse is not None:
+            if sbl_verse is None or (rp_verse is not None and rp_verse[0] < sbl_verse[0]):
+                write_verse_alignment(writer, book_id, book, *rp_verse[0], rp_verse[1], [])
+                rp_verse = next(rp_verses, None)
+            elif rp_verse is None or sbl_verse[0] < rp_verse[0]:
+                write_verse_alignment(writer, book_id, book, *sbl_verse[0], [], sbl_verse[1])
+                sbl_verse = next(sbl_verses, None)
             else:
+                write_verse_alignment(writer, book_id, book, *rp_verse[0], rp_verse[1], sbl_verse[1])
+                rp_verse = next(rp_verses, None)
+                sbl_verse = next(sbl_verses, None)
 
-                cursor.execute('''WITH sbl AS (
-                                SELECT id, std_poly_LC, book, chapter, verse, word_index FROM sbl_words WHERE book = ? AND chapter = ? AND verse = ?
-                            )
-                            SELECT sbl.id, sbl.book, sbl.chapter, sbl.verse, sbl.word_index, spinf.str_num_1, spinf.str_num_2, spinf.str_num_3
-                           FROM sbl
-                           LEFT JOIN std_poly_info spinf
-                           ON sbl.std_poly_LC = spinf.std_poly_LC''',
-                        (sbl_bcv_row[book_index], sbl_bcv_row[chapter_index], sbl_bcv_row[verse_index]))
-                sbl_rows = cursor.fetchall()
-                for sbl_row in sbl_rows:
-                    cursor.execute("INSERT INTO sbl_word_order (sbl_id, word_order) VALUES (?, ?)", (sbl_row[id_index], sbl_row[word_index_index]))
-                sbl_bcv_counter += 1
-                rp_turn = True
-        else:
-            cursor.execute('''WITH winst AS (
-                            SELECT id, book, chapter, verse, word_index FROM word_instances WHERE book = ? AND chapter = ? AND verse = ?
-                           )
-                           SELECT winst.id, winst.book, winst.chapter, winst.verse, winst.word_index, pinf.str_num FROM winst
-                           LEFT JOIN parsed_word_info pinf ON winst.id = pinf.instance_id
-                           ''',
-                        (rp_bcv_row[book_index], rp_bcv_row[chapter_index], rp_bcv_row[verse_index]))
-            rp_rows = cursor.fetchall()
-
-            cursor.execute('''WITH sbl AS (
-                                SELECT id, std_poly_LC, book, chapter, verse, word_index FROM sbl_words WHERE book = ? AND chapter = ? AND verse = ?
-                            )
-                            SELECT sbl.id, sbl.book, sbl.chapter, sbl.verse, sbl.word_index, spinf.str_num_1, spinf.str_num_2, spinf.str_num_3
-                           FROM sbl
-                           LEFT JOIN std_poly_info spinf
-                           ON sbl.std_poly_LC = spinf.std_poly_LC''',
-                        (sbl_bcv_row[book_index], sbl_bcv_row[chapter_index], sbl_bcv_row[verse_index]))
-            sbl_rows = cursor.fetchall()
-
-            rp_counter = 0
-            sbl_counter = 0
-
-            rp_orders = {}
-            sbl_orders = {}
-
-            curr_order = 1
-
-            rp_done = False
-            sbl_done = False
-
-            while not rp_done or not sbl_done:
-                rp_num = rp_rows[rp_counter][str_num_index]
-                sbl_nums =  sbl_rows[sbl_counter][str_num_index:]
-                
-                if rp_num in sbl_nums:                    
-                    rp_orders[rp_rows[rp_counter][id_index]] = curr_order
-                    sbl_orders[sbl_rows[sbl_counter][id_index]] = curr_order
-                    rp_counter += 1
-                    sbl_counter += 1
-                    curr_order += 1
-                else:
-                    # checks if rp_num is any of the possible 3 sbl_nums in the following sbl_rows
-                    matched_sbl_index = next((i for i, sbl_row in enumerate(sbl_rows[sbl_counter:]) if rp_num in sbl_row[str_num_index:]), None)
-
-                    # checks if any of the sbl_nums is the rp_num of the following rp_rows
-                    matched_rp_index = next((i for i, rp_row in enumerate(rp_rows[rp_counter:]) if rp_row[str_num_index] in sbl_nums), None)
-
-                    rp_matched = matched_rp_index is not None
-                    sbl_matched = matched_sbl_index is not None
-                    sbl_match_first = False
-                    if rp_matched and sbl_matched:
-                        sbl_match_first = matched_sbl_index < matched_rp_index
-                    if (rp_matched and sbl_matched and sbl_match_first) or (sbl_matched and not rp_matched):
-                        for i in range(matched_sbl_index):
-                            sbl_orders[sbl_rows[sbl_counter][id_index]] = curr_order
-                            curr_order += 1
-                            sbl_counter += 1
-                    elif (rp_matched and sbl_matched and not sbl_match_first) or (rp_matched and not sbl_matched):
-                        for i in range(matched_rp_index):
-                            rp_orders[rp_rows[rp_counter][id_index]] = curr_order
-                            curr_order += 1
-                            rp_counter += 1
-                    else:
-                        rp_orders[rp_rows[rp_counter][id_index]] = curr_order
-                        curr_order += 1
-                        rp_counter += 1
-
-                if rp_counter >= len(rp_rows):
-
-                    rp_done = True
-                    for i in range(sbl_counter, len(sbl_rows)):
-                        sbl_orders[sbl_rows[sbl_counter][id_index]] = curr_order
-                        curr_order += 1
-                        sbl_counter += 1
-                    sbl_done = True
-                    
-                if sbl_counter >= len(sbl_rows):
-
-                    sbl_done = True
-                    for i in range(rp_counter, len(rp_rows)):
-                        rp_orders[rp_rows[rp_counter][id_index]] = curr_order
-                        curr_order += 1
-                        rp_counter += 1
-                    rp_done = True        
-
-            for rp_id, rp_order in rp_orders.items():
-                cursor.execute("INSERT INTO instance_word_order (instance_id, word_order) VALUES (?, ?)", (rp_id, rp_order))
-            
-            for sbl_id, sbl_order in sbl_orders.items():
-                cursor.execute("INSERT INTO sbl_word_order (sbl_id, word_order) VALUES (?, ?)", (sbl_id, sbl_order))
-
-            rp_bcv_counter += 1
-            sbl_bcv_counter += 1
-
-        if rp_bcv_counter >= len(rp_bcv_rows):
-
-            rp_bcv_done = True
-            for i in range(sbl_bcv_counter, len(sbl_bcv_rows)):
-                cursor.execute('''WITH sbl AS (
-                            SELECT id, std_poly_LC, book, chapter, verse, word_index FROM sbl_words WHERE book = ? AND chapter = ? AND verse = ?
-                        )
-                        SELECT sbl.id, sbl.book, sbl.chapter, sbl.verse, sbl.word_index, spinf.str_num_1, spinf.str_num_2, spinf.str_num_3
-                        FROM sbl
-                        LEFT JOIN std_poly_info spinf
-                        ON sbl.std_poly_LC = spinf.std_poly_LC''',
-                    (sbl_bcv_row[book_index], sbl_bcv_row[chapter_index], sbl_bcv_row[verse_index]))
-                sbl_rows = cursor.fetchall()
-                for sbl_row in sbl_rows:
-                    cursor.execute("INSERT INTO sbl_word_order (sbl_id, word_order) VALUES (?, ?)", (sbl_row[id_index], sbl_row[word_index_index]))
-                sbl_bcv_counter += 1
-            sbl_bcv_done = True
-
-        if sbl_bcv_counter >= len(sbl_bcv_rows):
-
-            sbl_bcv_done = True
-            for i in range(rp_bcv_counter, len(rp_bcv_rows)):
-                cursor.execute('''WITH winst AS (
-                        SELECT id, book, chapter, verse, word_index FROM word_instances WHERE book = ? AND chapter = ? AND verse = ?
-                        )
-                        SELECT winst.id, winst.book, winst.chapter, winst.verse, winst.word_index, pinf.str_num FROM winst
-                        LEFT JOIN parsed_word_info pinf ON winst.id = pinf.instance_id
-                        ''',
-                    (rp_bcv_row[book_index], rp_bcv_row[chapter_index], rp_bcv_row[verse_index]))
-                rp_rows = cursor.fetchall()
-                for rp_row in rp_rows:
-                    cursor.execute("INSERT INTO instance_word_order (instance_id, word_order) VALUES (?, ?)", (rp_row[id_index], rp_row[word_index_index]))
-                rp_bcv_counter += 1
-            rp_bcv_done = True
+    writer.flush()
 
 
 def make_books(cursor):
@@ -1131,149 +1691,686 @@ def make_books(cursor):
                    book VARCHAR(45)
                    )''')
     
-    for abbrev in book_abbrevs:
-        cursor.execute("INSERT INTO books (book) VALUES (?)", (abbrev,))
+    cursor.executemany("INSERT INTO books (book) VALUES (?)", [(abbrev,) for abbrev in book_abbrevs])
 
 
-def make_rp_words_file(conn):
-    df = pd.read_sql_query('''SELECT inst.book, inst.chapter, inst.verse, inst.word_index, sinf.unicode, sinf.word FROM word_instances inst
-                   LEFT JOIN source_word_info sinf ON inst.source_id = sinf.id
-    ''', conn)
-    df.to_csv(Path(__file__).parent / ".." / "output" / "rp_words.csv", index=False, encoding="utf-8-sig")
+# Indexes the align and export stages need, which make_query_indexes makes too - they are made wherever they're needed
+# first, since the indexes stage runs after align
+SBL_WORDS_VERSE_INDEX = '''CREATE INDEX IF NOT EXISTS idx_sbl_words_verse
+                   ON sbl_words(book, chapter, verse, word_index, word, mono_LC, std_poly_LC)'''
 
+PARSED_WORDS_PARSING_INDEX = "CREATE INDEX IF NOT EXISTS idx_parsed_words_parsing ON parsed_words(instance_id, str_num, parse_code_id)"
 
-def make_word_classification(conn):
-    df = pd.read_sql_query('''
-        WITH rp AS (
-            SELECT winst.id, winst.book, winst.chapter, winst.verse, winst.word_index, winst.total_word_index, iwo.word_order, winst.unicode AS word, winst.word AS betacode,
-                    winst.std_poly_LC
-            FROM word_instances winst
-            LEFT JOIN
-            instance_word_order iwo ON winst.id = iwo.instance_id
-        ),
-        sbl AS (
-            SELECT sw.book, sw.chapter, sw.verse, sw.word_index, swo.word_order, sw.word, sw.std_poly_LC
-            FROM sbl_words sw
-            LEFT JOIN sbl_word_order swo
-            ON sw.id = swo.sbl_id
-        ),
-        rp_sbl AS (
-            SELECT rp.id AS inst_id, COALESCE(rp.book, sbl.book) AS book, COALESCE(rp.chapter, sbl.chapter) AS chapter, COALESCE(rp.verse, sbl.verse) AS verse, rp.word_index,
-                 rp.total_word_index, COALESCE(rp.word_order, sbl.word_order) AS word_order, rp.word AS rp_word, sbl.word AS sbl_word, rp.betacode,
-                           COALESCE(rp.std_poly_LC, sbl.std_poly_LC) AS std_poly_LC
-            FROM rp
-            LEFT JOIN sbl ON rp.book = sbl.book AND rp.chapter = sbl.chapter AND rp.verse = sbl.verse AND rp.word_order = sbl.word_order
-                           
-            UNION
-                           
-            SELECT rp.id AS inst_id, COALESCE(rp.book, sbl.book) AS book, COALESCE(rp.chapter, sbl.chapter) AS chapter, COALESCE(rp.verse, sbl.verse) AS verse, rp.word_index,
-                 rp.total_word_index, COALESCE(rp.word_order, sbl.word_order) AS word_order, rp.word AS rp_word, sbl.word AS sbl_word, rp.betacode,
-                           COALESCE(rp.std_poly_LC, sbl.std_poly_LC) AS std_poly_LC
-            FROM sbl
-            LEFT JOIN rp ON rp.book = sbl.book AND rp.chapter = sbl.chapter AND rp.verse = sbl.verse AND rp.word_order = sbl.word_order
-        ),
-        with_info AS (
-            SELECT rp_sbl.inst_id, rp_sbl.book, rp_sbl.chapter, rp_sbl.verse, rp_sbl.word_index,
-                 rp_sbl.total_word_index, rp_sbl.word_order, rp_sbl.rp_word, rp_sbl.sbl_word, rp_sbl.betacode,
-                           rp_sbl.std_poly_LC,
-                           pwi.unicode AS mono_LC,
-                           COALESCE(pwi.str_num, spi.str_num_1) AS final_str_num,
-                           
-                            CASE
-                                WHEN pwi.str_num IS NULL OR pwi.str_num = spi.str_num_1 THEN spi.str_num_2
-                                WHEN pwi.str_num = spi.str_num_2 THEN spi.str_num_1
-                                ELSE spi.str_num_1
-                            END AS alt_1_str_num,
-
-                            CASE
-                                WHEN pwi.str_num = spi.str_num_2 THEN spi.str_num_3
-                                WHEN pwi.str_num = spi.str_num_3 THEN spi.str_num_2
-                                ELSE spi.str_num_3
-                            END AS alt_2_str_num,
-                           
-                            pwi.rp_code,
-                            pwi.rp_alt_code,
-                            pwi.rp_pos,
-                            pwi.rp_gender,
-                            pwi.rp_alt_gender,
-                            pwi.rp_number,
-                            pwi.rp_word_case,
-                            pwi.rp_alt_word_case,
-                            pwi.rp_tense,
-                            pwi.rp_type,
-                            pwi.rp_voice,
-                            pwi.rp_mood,
-                            pwi.rp_alt_mood,
-                            pwi.rp_person,
-                            pwi.rp_indeclinable,
-                            pwi.rp_why_indeclinable,
-                            pwi.rp_kai_crasis,
-                            pwi.rp_attic_greek_form
-
-            FROM rp_sbl
-            LEFT JOIN parsed_word_info pwI ON rp_sbl.inst_id = pwI.instance_id
-            LEFT JOIN std_poly_info spi ON rp_sbl.std_poly_LC = spi.std_poly_LC
-        ),
-        final AS (
-            SELECT with_info.book, with_info.chapter, with_info.verse, with_info.word_index,
-                 with_info.total_word_index, with_info.word_order, with_info.rp_word AS source_form, with_info.sbl_word AS sbl_source_form, with_info.mono_LC, with_info.betacode,
-                           with_info.std_poly_LC, si.word AS lemma, with_info.final_str_num AS str_num, si.root_1, si.root_2, si.root_3,
-                           with_info.alt_1_str_num, with_info.alt_2_str_num, si.def AS str_def, with_info.rp_code, with_info.rp_alt_code,
-                            with_info.rp_pos, with_info.rp_gender, with_info.rp_alt_gender, with_info.rp_number, with_info.rp_word_case, with_info.rp_alt_word_case,
-                           with_info.rp_tense, with_info.rp_type, with_info.rp_voice, with_info.rp_mood, with_info.rp_alt_mood, with_info.rp_person, with_info.rp_indeclinable,
-                           with_info.rp_why_indeclinable, with_info.rp_kai_crasis, with_info.rp_attic_greek_form, bo.id AS book_id
-            FROM with_info
-            LEFT JOIN strongs_info si ON with_info.final_str_num = si.str_num
-            LEFT JOIN books bo ON with_info.book = bo.book
-        )
-        SELECT book, chapter, verse, word_index,
-                 total_word_index, source_form, sbl_source_form, mono_LC, betacode,
-                           std_poly_LC, lemma, str_num, root_1, root_2, root_3,
-                           alt_1_str_num, alt_2_str_num, str_def, rp_code, rp_alt_code,
-                            rp_pos, rp_gender, rp_alt_gender, rp_number, rp_word_case, rp_alt_word_case,
-                           rp_tense, rp_type, rp_voice, rp_mood, rp_alt_mood, rp_person, rp_indeclinable,
-                           rp_why_indeclinable, rp_kai_crasis, rp_attic_greek_form
-        FROM final
-        ORDER BY book_id, chapter, verse, word_order
-    ''', conn)
+STRONGS_INFO_STR_NUM_INDEX = "CREATE INDEX IF NOT EXISTS idx_strongs_info_str_num_lemma ON strongs_info(str_num, word)"
 
-    df.to_csv(Path(__file__).parent / ".." / "output" / "word_classification.csv", index=False, encoding="utf-8-sig")
+# Indexes of earlier builds that start with the same columns as a wider index above, or of make_query_indexes,
+# so they'd only be a second copy to keep up to date
+REDUNDANT_INDEXES = ("idx_sbl_words_bcv", "idx_sbl_words", "idx_word_instances", "idx_parsed_words_instance_id", "idx_strongs_info_str_num")
 
+def drop_redundant_indexes(cursor):
+    for index in REDUNDANT_INDEXES:
+        cursor.execute(f"DROP INDEX IF EXISTS {index}")
 
-def main():
-    # Connect to a database (or create it)
-    conn = sqlite3.connect(Path(__file__).parent / ".." / "WordGuide.db")
-    cursor = conn.cursor()
+# Covering indexes for the lookups of WordGuideQueries.py
+def make_query_indexes(cursor):
+    drop_redundant_indexes(cursor)
 
-    make_betacode_bible(cursor)
+    # get_verse and get_word
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_word_instances_verse
+                   ON word_instances(book, chapter, verse, word_index, id, total_word_index, unicode, word, std_poly_LC)''')
 
-    make_unicode_bible(cursor)
+    cursor.execute(PARSED_WORDS_PARSING_INDEX)
 
-    make_long_trait_codes()
+    cursor.execute(SBL_WORDS_VERSE_INDEX)
 
-    make_word_instances(cursor)
+    # occurrences and forms_of
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_parsed_words_str_num ON parsed_words(str_num, instance_id)")
 
-    make_parsed_word_info(cursor)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_strongs_info_lemma ON strongs_info(word, str_num)")
 
-    make_std_poly_info(cursor)
-    
-    make_strongs_info(cursor)
+    cursor.execute(STRONGS_INFO_STR_NUM_INDEX)
 
-    make_source_verses(cursor)
+    # parse
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_parsed_words_form ON parsed_words(unicode, str_num, parse_code_id)")
 
-    make_str_num_verses(cursor)
-    
-    make_sbl_words(cursor)
 
-    make_word_orders(cursor)
+# Full text search over the verses and Strong's number posting lists, for WordGuideQueries.py
+# verse_search holds the text of every verse in mono_LC form (no accents, lowercase) so searches ignore accents and case
+# The rowid of every verse is the total_word_index of its first word, so searches ordered by rowid are in canonical order
+# str_num_postings holds the sorted total_word_index of every word with a Strong's number as an array('I') blob - it is
+# made again for every book even when only some books are rebuilt
+def make_search_index(cursor, corpus, books = None):
+    corpus.load_parsings()
 
-    make_books(cursor)
+    clear_books(cursor, 'verse_search', books)
 
-    make_word_classification(conn)
+    cursor.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS verse_search USING fts5(
+                   book UNINDEXED,
+                   chapter UNINDEXED,
+                   verse UNINDEXED,
+                   verse_text,
+                   tokenize = 'unicode61 remove_diacritics 2'
+                   )''')
 
-    # Always close the connection
+    cursor.execute('DROP TABLE IF EXISTS str_num_postings')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS str_num_postings (
+                   str_num INTEGER PRIMARY KEY,
+                   count INTEGER,
+                   positions BLOB
+                   )''')
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_word_instances_position ON word_instances(total_word_index, book, chapter, verse, word_index)")
+
+    writer = BulkWriter(cursor)
+
+    # A word is searched by the form of its parsed word, or its own unicode form if it has none
+    for book_id, book in selected_books(books):
+        for (chapter, verse), positions in groupby(corpus.book_positions(book_id),
+                                                   key=lambda position: (corpus.chapters[position], corpus.verses[position])):
+            positions = list(positions)
+            verse_text = " ".join(corpus.forms[corpus.parsed_ids[position] or corpus.unicode_ids[position]] for position in positions)
+            writer.execute("INSERT INTO verse_search (rowid, book, chapter, verse, verse_text) VALUES (?, ?, ?, ?, ?)",
+                           (positions[0] + 1, book, chapter, verse, verse_text))
+    writer.flush()
+
+    postings = defaultdict(lambda: array('I'))
+    for position, str_num in enumerate(corpus.str_nums):
+        if str_num != NO_STR_NUM:
+            postings[str_num].append(position + 1)
+    for str_num in sorted(postings):
+        positions = postings[str_num]
+        writer.execute("INSERT INTO str_num_postings (str_num, count, positions) VALUES (?, ?, ?)", (str_num, len(positions), positions.tobytes()))
+    writer.flush()
+
+
+def make_rp_words_file(conn):
+    import pandas as pd
+
+    df = pd.read_sql_query('''SELECT inst.book, inst.chapter, inst.verse, inst.word_index, sinf.unicode, sinf.word FROM word_instances inst
+                   LEFT JOIN source_word_info sinf ON inst.source_id = sinf.id
+    ''', conn)
+    df.to_csv(OUTPUT_DIR / "rp_words.csv", index=False, encoding="utf-8-sig")
+
+
+# One row per line of word_classification, in output order - aligned_rows is scanned in key order
+WORD_CLASSIFICATION_QUERY = '''
+    WITH with_info AS (
+        SELECT ar.book_id, ar.chapter, ar.verse, ar.word_order, winst.word_index, winst.total_word_index,
+                       winst.unicode AS rp_word, sw.word AS sbl_word, winst.word AS betacode,
+                       COALESCE(winst.std_poly_LC, sw.std_poly_LC) AS std_poly_LC,
+                       pwi.unicode AS mono_LC,
+                       COALESCE(pwi.str_num, spi.str_num_1) AS final_str_num,
+
+                        CASE
+                            WHEN pwi.str_num IS NULL OR pwi.str_num = spi.str_num_1 THEN spi.str_num_2
+                            WHEN pwi.str_num = spi.str_num_2 THEN spi.str_num_1
+                            ELSE spi.str_num_1
+                        END AS alt_1_str_num,
+
+                        CASE
+                            WHEN pwi.str_num = spi.str_num_2 THEN spi.str_num_3
+                            WHEN pwi.str_num = spi.str_num_3 THEN spi.str_num_2
+                            ELSE spi.str_num_3
+                        END AS alt_2_str_num,
+
+                        pc.rp_code,
+                        pc.rp_alt_code,
+                        pc.rp_pos,
+                        pc.rp_gender,
+                        pc.rp_alt_gender,
+                        pc.rp_number,
+                        pc.rp_word_case,
+                        pc.rp_alt_word_case,
+                        pc.rp_tense,
+                        pc.rp_type,
+                        pc.rp_voice,
+                        pc.rp_mood,
+                        pc.rp_alt_mood,
+                        pc.rp_person,
+                        pc.rp_indeclinable,
+                        pc.rp_why_indeclinable,
+                        pc.rp_kai_crasis,
+                        pc.rp_attic_greek_form
+
+        FROM aligned_rows ar
+        LEFT JOIN word_instances winst ON ar.instance_id = winst.id
+        LEFT JOIN sbl_words sw ON ar.sbl_id = sw.id
+        LEFT JOIN parsed_words pwi ON ar.instance_id = pwi.instance_id
+        LEFT JOIN parse_codes pc ON pwi.parse_code_id = pc.id
+        LEFT JOIN std_poly_info spi ON COALESCE(winst.std_poly_LC, sw.std_poly_LC) = spi.std_poly_LC
+    )
+    SELECT bo.book, with_info.chapter, with_info.verse, with_info.word_index,
+             with_info.total_word_index, with_info.rp_word AS source_form, with_info.sbl_word AS sbl_source_form, with_info.mono_LC, with_info.betacode,
+                       with_info.std_poly_LC, si.word AS lemma, with_info.final_str_num AS str_num, si.root_1, si.root_2, si.root_3,
+                       with_info.alt_1_str_num, with_info.alt_2_str_num, si.def AS str_def, with_info.rp_code, with_info.rp_alt_code,
+                        with_info.rp_pos, with_info.rp_gender, with_info.rp_alt_gender, with_info.rp_number, with_info.rp_word_case, with_info.rp_alt_word_case,
+                       with_info.rp_tense, with_info.rp_type, with_info.rp_voice, with_info.rp_mood, with_info.rp_alt_mood, with_info.rp_person, with_info.rp_indeclinable,
+                       with_info.rp_why_indeclinable, with_info.rp_kai_crasis, with_info.rp_attic_greek_form
+    FROM with_info
+    LEFT JOIN strongs_info si ON with_info.final_str_num = si.str_num
+    LEFT JOIN books bo ON with_info.book_id = bo.id
+    ORDER BY with_info.book_id, with_info.chapter, with_info.verse, with_info.word_order
+'''
+
+# Columns of word_classification that hold integers - the rest hold text
+WORD_CLASSIFICATION_INT_COLUMNS = ("chapter", "verse", "word_index", "total_word_index", "str_num", "alt_1_str_num", "alt_2_str_num")
+
+# Writes word_classification.csv, a chunk of rows at a time
+def make_word_classification(conn):
+    drop_redundant_indexes(conn)
+    conn.execute(STRONGS_INFO_STR_NUM_INDEX)
+
+    cursor = conn.execute(WORD_CLASSIFICATION_QUERY)
+    with open(OUTPUT_DIR / "word_classification.csv", "w", encoding="utf-8-sig", newline="") as file:
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(column[0] for column in cursor.description)
+        for rows in iter(lambda: cursor.fetchmany(BULK_BATCH_SIZE), []):
+            writer.writerows(rows)
+
+# Writes word_classification.parquet with one row group per book, so readers can load only the books and columns they need
+# Text columns are dictionary encoded (categoricals in pandas) and the references and Strong's numbers are int32 -
+# anything in them that isn't a number, like the "!!!" of std_poly_info, is left empty
+# Needs pyarrow, which the rest of the build doesn't
+def make_word_classification_parquet(conn):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as error:
+        raise ImportError("ERROR IN make_word_classification_parquet: THE PARQUET EXPORT NEEDS PYARROW (pip install pyarrow)") from error
+
+    drop_redundant_indexes(conn)
+    conn.execute(STRONGS_INFO_STR_NUM_INDEX)
+
+    cursor = conn.execute(WORD_CLASSIFICATION_QUERY)
+    columns = [column[0] for column in cursor.description]
+    text_type = pa.dictionary(pa.int32(), pa.string())
+    schema = pa.schema([(column, pa.int32() if column in WORD_CLASSIFICATION_INT_COLUMNS else text_type) for column in columns])
+
+    rows = chain.from_iterable(iter(lambda: cursor.fetchmany(BULK_BATCH_SIZE), []))
+    with pq.ParquetWriter(OUTPUT_DIR / "word_classification.parquet", schema) as writer:
+        for _, book_rows in groupby(rows, key=itemgetter(0)):
+            book_columns = zip(*book_rows)
+            arrays = []
+            for column, values in zip(columns, book_columns):
+                if column in WORD_CLASSIFICATION_INT_COLUMNS:
+                    arrays.append(pa.array([value if isinstance(value, int) else None for value in values], pa.int32()))
+                else:
+                    arrays.append(pa.array([value if value is None else str(value) for value in values], pa.string()).dictionary_encode())
+            table = pa.Table.from_arrays(arrays, schema=schema)
+            writer.write_table(table, row_group_size=table.num_rows)
+
+
+# BUILD STAGES
+
+# One step of the build: the make_* function and the names of the build resources it is called with,
+# a function listing the source files and tool csvs it reads, the stages whose tables or files it reads,
+# the tables and files it makes, and whether it can rebuild only some books (with the "books" resource)
+Stage = namedtuple("Stage", ["name", "function", "arguments", "input_paths", "upstream", "tables", "output_paths", "by_book"],
+                   defaults=(False,))
+
+def no_paths():
+    return []
+
+STAGES = [
+    Stage("instances", make_word_instances, ("cursor", "corpus", "normalizers", "jobs", "books"),
+          lambda: betacode_book_paths() + betacode_table_paths(), (), ("word_instances", "betacode_bible", "unicode_bible"), no_paths, True),
+    Stage("external_unicode", make_external_unicode_bible, ("cursor",), external_unicode_book_paths, (), ("external_unicode_bible",), no_paths),
+    Stage("verify", make_unicode_verification, ("cursor",), lambda: [unicode_mismatch_allowlist_path()], ("instances", "external_unicode"),
+          ("unicode_mismatches",), no_paths),
+    Stage("long_traits", make_long_trait_codes, (), trait_table_paths, (), (), lambda: [TOOLS_DIR / "long_trait_codes.csv"]),
+    Stage("parsed", make_parsed_word_info, ("cursor", "corpus", "normalizers", "jobs", "books"),
+          lambda: strongs_book_paths() + betacode_table_paths() + [TOOLS_DIR / "rp_code_info.csv"] + trait_table_paths(),
+          ("instances", "long_traits"), ("parsed_words", "parse_codes", "parsed_word_info"), no_paths, True),
+    Stage("std_poly", make_std_poly_info, ("cursor",), no_paths, ("parsed",), ("std_poly_info",), no_paths),
+    Stage("strongs", make_strongs_info, ("cursor",), lambda: [strongs_definitions_path()], (), ("strongs_info",), no_paths),
+    Stage("source_verses", make_source_verses, ("cursor", "books"), no_paths, ("instances",), ("source_verses",), no_paths, True),
+    Stage("str_num_verses", make_str_num_verses, ("cursor", "books"), no_paths, ("instances", "parsed"), ("str_num_verses",), no_paths, True),
+    Stage("sbl", make_sbl_words, ("cursor", "normalizers", "jobs", "books"), lambda: sbl_book_paths() + [TOOLS_DIR / "SBLGNT" / "characters.csv"], (),
+          ("sbl_words",), no_paths, True),
+    Stage("align", make_word_orders, ("cursor", "corpus", "books"), no_paths, ("instances", "parsed", "sbl", "std_poly"),
+          ("instance_word_order", "sbl_word_order", "aligned_rows", "verse_alignment_scores"), no_paths, True),
+    Stage("books", make_books, ("cursor",), no_paths, (), ("books",), no_paths),
+    Stage("indexes", make_query_indexes, ("cursor",), no_paths, ("instances", "parsed", "sbl", "strongs"), (), no_paths),
+    Stage("search", make_search_index, ("cursor", "corpus", "books"), no_paths, ("instances", "parsed"), ("verse_search", "str_num_postings"), no_paths, True),
+    Stage("export", make_word_classification, ("conn",), no_paths, ("instances", "align", "sbl", "parsed", "std_poly", "strongs", "books"),
+          (), lambda: [OUTPUT_DIR / "word_classification.csv"]),
+    Stage("parquet", make_word_classification_parquet, ("conn",), no_paths, ("instances", "align", "sbl", "parsed", "std_poly", "strongs", "books"),
+          (), lambda: [OUTPUT_DIR / "word_classification.parquet"])
+]
+
+# Stages that only run when asked for on the command line
+OPTIONAL_STAGES = ("parquet",)
+
+# Records which inputs every completed stage used, so later builds only rerun the stages whose inputs changed
+def make_build_tables(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS build_stages (
+                   stage VARCHAR(45) PRIMARY KEY,
+                   fingerprint VARCHAR(64),
+                   completed_at VARCHAR(45)
+                   )''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS build_inputs (
+                   stage VARCHAR(45),
+                   input VARCHAR(255),
+                   content_hash VARCHAR(64),
+                   PRIMARY KEY (stage, input)
+                   )''')
+
+def content_hash(path):
+    try:
+        return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    except FileNotFoundError:
+        return "missing"
+
+def input_name(path):
+    path = Path(path)
+    if path.is_relative_to(ROOT_DIR):
+        return path.relative_to(ROOT_DIR).as_posix()
+    return path.as_posix()
+
+# Content hashes of everything a stage reads: this script, its source files and tool csvs, and its upstream stages
+# An upstream stage's tables are hashed by that stage's fingerprint, since the tables are made entirely from its inputs
+def stage_inputs(stage, fingerprints, file_hashes):
+    inputs = {}
+    for path in [Path(__file__)] + stage.input_paths():
+        name = input_name(path)
+        if name not in file_hashes:
+            file_hashes[name] = content_hash(path)
+        inputs[name] = file_hashes[name]
+    for upstream in stage.upstream:
+        inputs["stage:" + upstream] = fingerprints[upstream]
+    return inputs
+
+def stage_fingerprint(inputs):
+    digest = hashlib.sha256()
+    for name in sorted(inputs):
+        digest.update(f"{name}={inputs[name]}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+# Input names of the source files of the selected books
+def book_input_names(books):
+    names = set()
+    for file_paths in (betacode_book_paths(), external_unicode_book_paths(), strongs_book_paths(), sbl_book_paths()):
+        names.update(input_name(file_path) for file_path in selected_paths(file_paths, books))
+    return names
+
+# Fingerprints of the stages as they were last built
+def built_fingerprints(cursor):
+    cursor.execute("SELECT stage, fingerprint FROM build_stages")
+    return dict(cursor.fetchall())
+
+# The inputs to record for a stage that is about to be rebuilt - upstream stages are recorded by the fingerprints they
+# were last built with, which aren't the planned ones when they were skipped with --stages or only rebuilt for some books
+# A stage rebuilt for some books only catches up with the changes to those books: the other books' files, this script and
+# the tool csvs keep the hashes they were recorded with, and so does every upstream stage it was already behind or that
+# was rebuilt for every book, so it stays out of date until it is rebuilt for every book
+# built_before holds the fingerprints from before this build, built the ones so far, and rebuilt_fully the stages this
+# build rebuilt for every book
+def recorded_inputs(cursor, stage, inputs, books, built_before, built, rebuilt_fully):
+    if books is None or not stage.by_book:
+        recorded = dict(inputs)
+        for upstream in stage.upstream:
+            recorded["stage:" + upstream] = built.get(upstream, "never built")
+        return recorded
+
+    cursor.execute("SELECT input, content_hash FROM build_inputs WHERE stage = ?", (stage.name,))
+    recorded = dict(cursor.fetchall())
+    for name in inputs.keys() & book_input_names(books):
+        recorded[name] = inputs[name]
+    for upstream in stage.upstream:
+        name = "stage:" + upstream
+        if upstream not in rebuilt_fully and recorded.get(name) == built_before.get(upstream):
+            recorded[name] = built[upstream]
+    return recorded
+
+# Works out which stages to run and why - a stage is rebuilt if it was forced, has never completed,
+# one of its inputs changed since it last completed, or one of its tables or files is missing
+def plan_build(cursor, stages, forced = ()):
+    cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")
+    existing_tables = {row[0] for row in cursor.fetchall()}
+
+    recorded_fingerprints = {}
+    recorded_by_stage = defaultdict(dict)
+    if "build_stages" in existing_tables and "build_inputs" in existing_tables:
+        cursor.execute("SELECT stage, fingerprint FROM build_stages")
+        recorded_fingerprints = dict(cursor.fetchall())
+        cursor.execute("SELECT stage, input, content_hash FROM build_inputs")
+        for stage_name, name, recorded_hash in cursor.fetchall():
+            recorded_by_stage[stage_name][name] = recorded_hash
+
+    plan = []
+    fingerprints = {}
+    file_hashes = {}
+    for stage in stages:
+        inputs = stage_inputs(stage, fingerprints, file_hashes)
+        fingerprint = stage_fingerprint(inputs)
+        fingerprints[stage.name] = fingerprint
+
+        reasons = []
+        if stage.name in forced:
+            reasons.append("forced")
+        if stage.name not in recorded_fingerprints:
+            reasons.append("never built")
+        else:
+            if recorded_fingerprints[stage.name] != fingerprint:
+                recorded = recorded_by_stage[stage.name]
+                changed = sorted(name for name in inputs.keys() | recorded.keys() if inputs.get(name) != recorded.get(name))
+                reasons.append("changed " + ", ".join(changed))
+            missing = [table for table in stage.tables if table not in existing_tables]
+            missing += [input_name(path) for path in stage.output_paths() if not Path(path).exists()]
+            if missing:
+                reasons.append("missing " + ", ".join(missing))
+        plan.append((stage, inputs, fingerprint, reasons))
+    return plan
+
+# Runs one stage and records its inputs in a single explicit transaction - a stage that fails or is interrupted
+# leaves the database as it was before the stage, and the next build picks up from that stage
+def run_stage(conn, stage, resources, inputs, fingerprint):
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN")
+    try:
+        stage.function(*[resources[name] for name in stage.arguments])
+
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM build_inputs WHERE stage = ?", (stage.name,))
+        cursor.executemany("INSERT INTO build_inputs (stage, input, content_hash) VALUES (?, ?, ?)",
+                           [(stage.name, name, inputs[name]) for name in sorted(inputs)])
+        cursor.execute('''INSERT INTO build_stages (stage, fingerprint, completed_at) VALUES (?, ?, ?)
+                       ON CONFLICT (stage) DO UPDATE SET fingerprint = excluded.fingerprint, completed_at = excluded.completed_at''',
+                       (stage.name, fingerprint, datetime.now().isoformat(timespec="seconds")))
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+# BUILD REPORT
+
+# Number of lines of a text file, or 0 if it doesn't exist
+def file_lines(path):
+    try:
+        with open(path, "rb") as file:
+            return sum(1 for _ in file)
+    except FileNotFoundError:
+        return 0
+
+def table_rows(cursor, table):
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (table,))
+    row = cursor.fetchone()
+    # Views are left out so the rows behind them aren't counted twice
+    if row is None or row[0] != "table":
+        return 0
+    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+    return cursor.fetchone()[0]
+
+# Rows of an output file - the lines of a csv less its header, or the rows of a parquet file
+def file_rows(path):
+    path = Path(path)
+    if path.suffix == ".csv":
+        return max(file_lines(path) - 1, 0)
+    if path.suffix == ".parquet" and path.exists():
+        import pyarrow.parquet as pq
+        return pq.read_metadata(path).num_rows
+    return 0
+
+# Rows a stage made - the rows of its tables and of the files it writes
+def stage_rows(cursor, stage):
+    rows = sum(table_rows(cursor, table) for table in stage.tables)
+    rows += sum(file_rows(path) for path in stage.output_paths())
+    return rows
+
+# Rows a stage reads - the rows of its upstream stages and the lines of its source files and tool csvs
+# row_counts holds the rows of the stages counted so far in this build, so they aren't counted again
+def stage_input_rows(cursor, stage, stages_by_name, row_counts):
+    rows = 0
+    for upstream in stage.upstream:
+        if upstream not in row_counts:
+            row_counts[upstream] = stage_rows(cursor, stages_by_name[upstream])
+        rows += row_counts[upstream]
+    rows += sum(file_lines(path) for path in stage.input_paths())
+    return rows
+
+# Peak resident memory of this process so far in MB, or None where the resource module is missing (Windows)
+# ru_maxrss is in KiB on Linux and in bytes on macOS
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return round(peak_rss / (1024 * 1024), 1)
+    return round(peak_rss / 1024, 1)
+
+# Runs a stage like run_stage and measures it: wall time, rows read and made, rows inserted, updated or deleted, and how
+# much it raised the peak memory of the process - 0 when it stayed under the peak of an earlier stage, since the peak is
+# all the operating system keeps. process_peak_rss_mb is the peak of the whole build so far
+# With profile_dir, also counts the SQL statements it ran (every row of an executemany counts as one) and the peak of the
+# memory Python allocated while it ran, and saves its cProfile stats as profile_dir/STAGE.pstats - these slow the stage down
+# a lot, so they're left out of normal builds. Worker processes started with --jobs aren't profiled or traced
+def measure_stage(conn, stage, resources, inputs, fingerprint, stages_by_name, row_counts, profile_dir = None):
+    cursor = conn.cursor()
+    rows_in = stage_input_rows(cursor, stage, stages_by_name, row_counts)
+
+    statements = 0
+    def count_statement(statement):
+        nonlocal statements
+        statements += 1
+
+    peak_before = peak_rss_mb()
+    profiler = None
+    if profile_dir is not None:
+        profiler = cProfile.Profile()
+        tracemalloc.start()
+        conn.set_trace_callback(count_statement)
+        profiler.enable()
+    changes = conn.total_changes
+    start = perf_counter()
+    try:
+        run_stage(conn, stage, resources, inputs, fingerprint)
+    finally:
+        seconds = perf_counter() - start
+        if profiler is not None:
+            profiler.disable()
+            conn.set_trace_callback(None)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    row_counts[stage.name] = stage_rows(cursor, stage)
+    measurement = {
+        "stage": stage.name,
+        "seconds": round(seconds, 3),
+        "rows_in": rows_in,
+        "rows_out": row_counts[stage.name],
+        "rows_changed": conn.total_changes - changes,
+        "peak_rss_increase_mb": None,
+        "process_peak_rss_mb": peak_rss_mb()
+    }
+    if peak_before is not None:
+        measurement["peak_rss_increase_mb"] = round(measurement["process_peak_rss_mb"] - peak_before, 1)
+    if profiler is not None:
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        profile_path = profile_dir / f"{stage.name}.pstats"
+        profiler.dump_stats(profile_path)
+        measurement["statements"] = statements
+        measurement["peak_traced_memory_mb"] = round(peak_memory / (1024 * 1024), 1)
+        measurement["profile"] = input_name(profile_path)
+    return measurement
+
+def stage_summary(measurement):
+    summary = (f"{measurement['stage']}: {measurement['seconds']:.2f} s, {measurement['rows_in']} rows in, {measurement['rows_out']} rows out, "
+               f"{measurement['rows_changed']} rows changed")
+    if measurement["peak_rss_increase_mb"] is not None:
+        summary += f", peak memory +{measurement['peak_rss_increase_mb']:.0f} MB ({measurement['process_peak_rss_mb']:.0f} MB process peak)"
+    if "statements" in measurement:
+        summary += f", {measurement['statements']} statements, {measurement['peak_traced_memory_mb']:.1f} MB traced peak"
+    return summary
+
+
+# Some builds of SQLite leave out FTS5, which the search stage needs - a temporary table with the tokenizer of
+# verse_search is made and dropped to check it's there
+def check_fts5(conn):
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_check USING fts5(text, tokenize = 'unicode61 remove_diacritics 2')")
+        conn.execute("DROP TABLE temp.fts5_check")
+    except sqlite3.OperationalError as error:
+        conn.close()
+        raise ValueError(f"ERROR IN check_fts5: THE SQLITE OF PYTHON'S sqlite3 MODULE HAS NO FTS5, WHICH THE SEARCH STAGE NEEDS ({error})") from error
+
+
+# Type of --books - book abbreviations separated by commas, like JOH,REV
+def book_list(value):
+    books = [book.strip().upper() for book in value.split(",") if book.strip()]
+    unknown = [book for book in books if book not in book_abbrevs]
+    if unknown or not books:
+        raise argparse.ArgumentTypeError(f"unknown book {', '.join(unknown)} - books: {', '.join(book_abbrevs)}")
+    return books
+
+# Type of --stages - stage names separated by commas, like parsed,align,export
+def stage_list(value):
+    stage_names = [stage.name for stage in STAGES]
+    stages = [stage.strip() for stage in value.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in stage_names]
+    if unknown or not stages:
+        raise argparse.ArgumentTypeError(f"unknown stage {', '.join(unknown)} - stages: {', '.join(stage_names)}")
+    return stages
+
+def parse_args(argv = None):
+    stage_names = [stage.name for stage in STAGES]
+    parser = argparse.ArgumentParser(description="Builds WordGuide.db and output/word_classification.csv from the files in external_sources. "
+                                     "Only the stages whose inputs changed since their last successful run are rebuilt.")
+    parser.add_argument("--force", action="append", default=[], choices=stage_names, metavar="STAGE",
+                        help="rebuild STAGE even if its inputs haven't changed, can be given more than once - stages: " + ", ".join(stage_names))
+    parser.add_argument("--jobs", type=int, default=1, metavar="N",
+                        help="tokenize and parse the books in N worker processes (default: 1, no worker processes)")
+    parser.add_argument("--parquet", action="store_true",
+                        help="also write output/word_classification.parquet (needs pyarrow)")
+    parser.add_argument("--stages", type=stage_list, metavar="STAGE,...",
+                        help="only rebuild these stages - the other stages that are out of date are skipped and stay out of date")
+    parser.add_argument("--books", type=book_list, metavar="BOOK,...",
+                        help="only rebuild the rows of these books (like JOH,REV) in the stages that can be rebuilt a book at a time - "
+                        "the other stages are rebuilt for every book. A book's words keep their total_word_index, so it can't gain "
+                        "or lose words. Books: " + ", ".join(book_abbrevs))
+    parser.add_argument("--db", type=Path, metavar="PATH", help="build this database instead of WordGuide.db")
+    parser.add_argument("--out", type=Path, metavar="DIR", help="write the output files to DIR instead of output")
+    parser.add_argument("--dry-run", action="store_true", help="list the stages that would be rebuilt and why, without building anything")
+    parser.add_argument("--profile", action="store_true",
+                        help="also count the SQL statements and trace the memory of every stage that is rebuilt, and save its "
+                        "cProfile stats to output/profiles/STAGE.pstats (much slower)")
+    return parser.parse_args(argv)
+
+
+def main(argv = None):
+    global DB_PATH, OUTPUT_DIR
+    args = parse_args(argv)
+    if args.db is not None:
+        DB_PATH = args.db
+    if args.out is not None:
+        OUTPUT_DIR = args.out
+    # The export stages and the build report write into it, so --out can be a folder that doesn't exist yet
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        raise ValueError(f"ERROR IN main: SQLITE {sqlite3.sqlite_version} IS TOO OLD - THE BUILD NEEDS "
+                         f"{'.'.join(map(str, MIN_SQLITE_VERSION))} OR NEWER")
+
+    # Connect to a database (or create it)
+    conn = sqlite3.connect(DB_PATH)
+    check_fts5(conn)
+    cursor = conn.cursor()
+    resources = {"cursor": cursor, "conn": conn, "corpus": Corpus(cursor), "normalizers": NormalizerPool(),
+                 "jobs": args.jobs, "books": args.books}
+
+    requested = set(args.force) | set(args.stages or ())
+    stages = [stage for stage in STAGES if stage.name not in OPTIONAL_STAGES or stage.name in requested or args.parquet]
+    plan = plan_build(cursor, stages, args.force)
+
+    # "rebuild", "skip" (out of date but not in --stages) or "up to date" for every stage, and the books it is rebuilt for
+    def action(stage, reasons):
+        if not reasons:
+            return "up to date"
+        if args.stages is not None and stage.name not in args.stages:
+            return "skip"
+        return "rebuild"
+
+    # Whether a stage is only rebuilt for the books of --books
+    def scoped(stage):
+        return args.books is not None and stage.by_book
+
+    def book_note(stage):
+        return f" {','.join(args.books)}" if scoped(stage) else ""
+
+    if args.dry_run:
+        for stage, _, _, reasons in plan:
+            if action(stage, reasons) == "up to date":
+                print(f"{stage.name}: up to date")
+            else:
+                print(f"{stage.name}: {action(stage, reasons)}{book_note(stage)} - " + "; ".join(reasons))
+        conn.close()
+        return
+
+    # A stage can only be rebuilt for some books once every book has been built
+    unbuilt = [stage.name for stage, _, _, reasons in plan if scoped(stage) and action(stage, reasons) == "rebuild"
+               and ("never built" in reasons or any(reason.startswith("missing ") for reason in reasons))]
+    if unbuilt:
+        conn.close()
+        raise ValueError(f"ERROR IN main: {', '.join(unbuilt).upper()} HAVEN'T BEEN BUILT FOR EVERY BOOK - BUILD THEM WITHOUT --books FIRST")
+
+    make_build_tables(cursor)
     conn.commit()
+
+    built_before = built_fingerprints(cursor)
+    built = dict(built_before)
+    rebuilt_fully = set()
+
+    # What each stage did, written to output/build_report.json even if a stage fails
+    stages_by_name = {stage.name: stage for stage in STAGES}
+    profile_dir = OUTPUT_DIR / "profiles" if args.profile else None
+    row_counts = {}
+    report = {"started_at": datetime.now().isoformat(timespec="seconds"), "jobs": args.jobs, "books": args.books, "stages": []}
+    try:
+        with build_pragmas(conn):
+            for stage, inputs, _, reasons in plan:
+                if action(stage, reasons) == "rebuild":
+                    print(f"{stage.name}: rebuilding{book_note(stage)} - " + "; ".join(reasons))
+                    recorded = recorded_inputs(cursor, stage, inputs, args.books, built_before, built, rebuilt_fully)
+                    fingerprint = stage_fingerprint(recorded)
+                    measurement = measure_stage(conn, stage, resources, recorded, fingerprint, stages_by_name, row_counts, profile_dir)
+                    built[stage.name] = fingerprint
+                    if not scoped(stage):
+                        rebuilt_fully.add(stage.name)
+                    print(stage_summary(measurement))
+                    report["stages"].append({**measurement, "reasons": reasons})
+
+                    # The verify stage gates the build - the stages after it don't run while the conversion to unicode
+                    # doesn't match the external unicode text, and verify runs again on the next build
+                    if stage.name == "verify":
+                        report["unicode_mismatches"] = unexpected_mismatches(cursor)
+                        if report["unicode_mismatches"]:
+                            cursor.execute("DELETE FROM build_stages WHERE stage = ?", (stage.name,))
+                            conn.commit()
+                            raise ValueError(f"ERROR IN main: {report['unicode_mismatches']} WORDS DIFFER BETWEEN unicode_bible AND "
+                                             "external_unicode_bible - SEE THE unicode_mismatches TABLE, AND ADD THE KNOWN DIFFERENCES "
+                                             "TO verification/unicode_mismatch_allowlist.csv")
+                elif action(stage, reasons) == "skip":
+                    print(f"{stage.name}: skipped - " + "; ".join(reasons))
+                    report["stages"].append({"stage": stage.name, "skipped": True, "reasons": reasons})
+                else:
+                    print(f"{stage.name}: up to date")
+                    report["stages"].append({"stage": stage.name, "reasons": []})
+    finally:
+        report["finished_at"] = datetime.now().isoformat(timespec="seconds")
+        (OUTPUT_DIR / "build_report.json").write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+    hits, misses = resources["normalizers"].counts()
+    if hits + misses:
+        print(f"normalization: {hits} cache hits, {misses} misses ({hits / (hits + misses):.0%} hits)")
+
+    # Always close the connection
     conn.close()
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+import unicodedata
+import re
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+
+
+# GLOBALS
+
+MAIN_DIR = Path(__file__).resolve().parent
+ROOT_DIR = MAIN_DIR.parent
+DB_PATH = ROOT_DIR / "WordGuide.db"
+
+# Number of verses kept in WordGuide's verse cache
+VERSE_CACHE_SIZE = 1024
+
+# Statements sqlite3 keeps prepared per connection - more than the queries below, so none are re-prepared
+CACHED_STATEMENTS = 32
+
+# A word of the Byzantine Majority Text with its Strong's number and parsing
+Word = namedtuple("Word", ["book", "chapter", "verse", "word_index", "total_word_index", "word", "betacode", "std_poly_LC",
+                           "str_num", "lemma", "rp_code", "rp_alt_code", "rp_pos"])
+
+# A word of the SBLGNT
+SblWord = namedtuple("SblWord", ["book", "chapter", "verse", "word_index", "word", "mono_LC", "std_poly_LC"])
+
+# Where a word is in the Byzantine Majority Text
+Reference = namedtuple("Reference", ["book", "chapter", "verse", "word_index"])
+
+# A form of a lemma and the number of times it appears
+Form = namedtuple("Form", ["word", "count"])
+
+# One of the ways a form is parsed and the number of times it's parsed that way
+Parsing = namedtuple("Parsing", ["str_num", "lemma", "rp_code", "rp_alt_code", "rp_pos", "count"])
+
+# A verse found by a search
+Verse = namedtuple("Verse", ["book", "chapter", "verse", "verse_text"])
+
+VERSE_REF_RE = re.compile(r"\s*(\w+)\s+(\d+):(\d+)\s*")
+
+
+# QUERIES
+
+RP_VERSE_QUERY = '''SELECT winst.book, winst.chapter, winst.verse, winst.word_index, winst.total_word_index, winst.unicode, winst.word,
+                           winst.std_poly_LC, pw.str_num,
+                           (SELECT si.word FROM strongs_info si WHERE si.str_num = pw.str_num LIMIT 1),
+                           pc.rp_code, pc.rp_alt_code, pc.rp_pos
+                    FROM word_instances winst
+                    LEFT JOIN parsed_words pw ON winst.id = pw.instance_id
+                    LEFT JOIN parse_codes pc ON pw.parse_code_id = pc.id
+                    WHERE winst.book = ? AND winst.chapter = ? AND winst.verse = ?
+                    ORDER BY winst.word_index'''
+
+SBL_VERSE_QUERY = '''SELECT book, chapter, verse, word_index, word, mono_LC, std_poly_LC FROM sbl_words
+                     WHERE book = ? AND chapter = ? AND verse = ?
+                     ORDER BY word_index'''
+
+OCCURRENCES_QUERY = '''SELECT winst.book, winst.chapter, winst.verse, winst.word_index FROM parsed_words pw
+                       JOIN word_instances winst ON pw.instance_id = winst.id
+                       WHERE pw.str_num = ?
+                       ORDER BY pw.instance_id'''
+
+FORMS_OF_STR_NUM_QUERY = '''SELECT winst.unicode, COUNT(*) FROM parsed_words pw
+                            JOIN word_instances winst ON pw.instance_id = winst.id
+                            WHERE pw.str_num = ?
+                            GROUP BY winst.unicode
+                            ORDER BY COUNT(*) DESC, winst.unicode'''
+
+FORMS_OF_LEMMA_QUERY = '''SELECT winst.unicode, COUNT(*) FROM parsed_words pw
+                          JOIN word_instances winst ON pw.instance_id = winst.id
+                          WHERE pw.str_num IN (SELECT str_num FROM strongs_info WHERE word = ?)
+                          GROUP BY winst.unicode
+                          ORDER BY COUNT(*) DESC, winst.unicode'''
+
+PARSE_QUERY = '''SELECT pw.str_num, (SELECT si.word FROM strongs_info si WHERE si.str_num = pw.str_num LIMIT 1),
+                        pc.rp_code, pc.rp_alt_code, pc.rp_pos, COUNT(*)
+                 FROM parsed_words pw
+                 JOIN parse_codes pc ON pw.parse_code_id = pc.id
+                 WHERE pw.unicode = ?
+                 GROUP BY pw.str_num, pc.rp_code, pc.rp_alt_code, pc.rp_pos
+                 ORDER BY COUNT(*) DESC, pw.str_num, pc.rp_code'''
+
+SEARCH_QUERY = '''SELECT book, chapter, verse, verse_text FROM verse_search
+                  WHERE verse_search MATCH ?
+                  ORDER BY rowid'''
+
+POSTINGS_QUERY = '''SELECT positions FROM str_num_postings WHERE str_num = ?'''
+
+POSITION_QUERY = '''SELECT book, chapter, verse, word_index FROM word_instances WHERE total_word_index = ?'''
+
+
+# HELPER FUNCTIONS
+
+# Returns (book, chapter, verse) for a reference like "MAT 1:1" or ("MAT", 1, 1)
+def parse_ref(ref):
+    if isinstance(ref, str):
+        match = VERSE_REF_RE.fullmatch(ref)
+        if not match:
+            raise ValueError(f"ERROR IN parse_ref: {ref!r} IS NOT A REFERENCE LIKE 'MAT 1:1'")
+        return match.group(1).upper(), int(match.group(2)), int(match.group(3))
+    book, chapter, verse = ref
+    return book.upper(), int(chapter), int(verse)
+
+# An FTS5 phrase matching the words of text in order, in mono_LC form
+def search_phrase(text):
+    words = [mono_form(word) for word in text.split()]
+    return '"' + " ".join(words).replace('"', '""') + '"'
+
+# Lowercase with no accents or breathings, like the unicode column of parsed_words
+def mono_form(word):
+    word = unicodedata.normalize('NFD', word.strip().lower())
+    word = ''.join(c for c in word if not unicodedata.combining(c))
+    return unicodedata.normalize('NFC', word)
+
+
+# WORD GUIDE
+
+# Read-only lookups over WordGuide.db - safe to share between threads, each of which gets its own connection
+class WordGuide:
+    def __init__(self, db_path=DB_PATH, verse_cache_size=VERSE_CACHE_SIZE):
+        self.uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
+        # (edition, book, chapter, verse) -> tuple of words, least recently used first
+        self.verse_cache = OrderedDict()
+        self.verse_cache_size = verse_cache_size
+        self.verse_cache_lock = threading.Lock()
+        # Opens the first connection now so a missing database fails here rather than on the first lookup
+        self.connection()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        with self.connections_lock:
+            for conn in self.connections:
+                conn.close()
+            self.connections.clear()
+        self.local = threading.local()
+
+    # This thread's connection
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+            self.local.conn = conn
+            with self.connections_lock:
+                self.connections.append(conn)
+        return conn
+
+    # The words of a verse in order, as Words for edition "rp" or SblWords for edition "sbl"
+    def get_verse(self, ref, edition="rp"):
+        book, chapter, verse = parse_ref(ref)
+        key = (edition, book, chapter, verse)
+        with self.verse_cache_lock:
+            words = self.verse_cache.get(key)
+            if words is not None:
+                self.verse_cache.move_to_end(key)
+                return words
+
+        if edition == "rp":
+            rows = self.connection().execute(RP_VERSE_QUERY, (book, chapter, verse)).fetchall()
+            words = tuple(Word(*row) for row in rows)
+        elif edition == "sbl":
+            rows = self.connection().execute(SBL_VERSE_QUERY, (book, chapter, verse)).fetchall()
+            words = tuple(SblWord(*row) for row in rows)
+        else:
+            raise ValueError(f"ERROR IN get_verse: UNKNOWN EDITION {edition!r}, EXPECTED 'rp' OR 'sbl'")
+
+        with self.verse_cache_lock:
+            self.verse_cache[key] = words
+            self.verse_cache.move_to_end(key)
+            while len(self.verse_cache) > self.verse_cache_size:
+                self.verse_cache.popitem(last=False)
+        return words
+
+    # The word at word_index (starting at 1) of a verse
+    def get_word(self, ref, word_index, edition="rp"):
+        words = self.get_verse(ref, edition)
+        if 1 <= word_index <= len(words) and words[word_index - 1].word_index == word_index:
+            return words[word_index - 1]
+        for word in words:
+            if word.word_index == word_index:
+                return word
+        raise IndexError(f"ERROR IN get_word: {ref!r} HAS NO WORD {word_index}")
+
+    # References to every Byzantine Majority Text word with a Strong's number, in canonical order
+    def occurrences(self, str_num):
+        rows = self.connection().execute(OCCURRENCES_QUERY, (int(str_num),)).fetchall()
+        return [Reference(*row) for row in rows]
+
+    # The forms of a lemma, most common first - the lemma is the Strong's number or the dictionary form
+    def forms_of(self, lemma):
+        if isinstance(lemma, int):
+            rows = self.connection().execute(FORMS_OF_STR_NUM_QUERY, (lemma,)).fetchall()
+        else:
+            rows = self.connection().execute(FORMS_OF_LEMMA_QUERY, (unicodedata.normalize('NFC', lemma.strip()),)).fetchall()
+        return [Form(*row) for row in rows]
+
+    # The ways a form is parsed in the Byzantine Majority Text, most common first - accents and case are ignored
+    def parse(self, form):
+        rows = self.connection().execute(PARSE_QUERY, (mono_form(form),)).fetchall()
+        return [Parsing(*row) for row in rows]
+
+    # Verses containing the words of text in order, ignoring accents and case
+    def search(self, text):
+        if not text.split():
+            return []
+        rows = self.connection().execute(SEARCH_QUERY, (search_phrase(text),)).fetchall()
+        return [Verse(*row) for row in rows]
+
+    # The sorted total_word_index of every Byzantine Majority Text word with a Strong's number
+    def postings(self, str_num):
+        positions = array('I')
+        row = self.connection().execute(POSTINGS_QUERY, (int(str_num),)).fetchone()
+        if row is not None:
+            positions.frombytes(row[0])
+        return positions
+
+    def reference(self, total_word_index):
+        return Reference(*self.connection().execute(POSITION_QUERY, (total_word_index,)).fetchone())
+
+    # (Reference, Reference) for every pair of words with Strong's numbers str_num and other_str_num within distance words
+    # of each other, in canonical order
+    def near(self, str_num, other_str_num, distance):
+        other_positions = self.postings(other_str_num)
+        pairs = []
+        for position in self.postings(str_num):
+            first = bisect_left(other_positions, position - distance)
+            last = bisect_right(other_positions, position + distance)
+            for other_position in other_positions[first:last]:
+                if other_position != position:
+                    pairs.append((self.reference(position), self.reference(other_position)))
+        return pairs
+
+    # References to the first word of every run of consecutive words with the Strong's numbers str_nums
+    def str_num_phrase(self, str_nums):
+        if not str_nums:
+            return []
+        positions = self.postings(str_nums[0])
+        for offset, str_num in enumerate(str_nums[1:], 1):
+            following = set(self.postings(str_num))
+            positions = [position for position in positions if position + offset in following]
+        return [self.reference(position) for position in positions]